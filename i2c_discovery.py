@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+I2C-Bus-Erkennung für den PCA9555 des Fitlet3
+Listet Adapter über sysfs, prüft nur die erwarteten Adressen parallel auf
+allen Bussen (ein Lesezugriff pro Adresse, Gesamtzeit begrenzt) und merkt sich
+das Ergebnis. Timeout und Retries der Adapter werden nicht verändert - die
+i2c-dev ioctls dafür gelten für den ganzen Adapter, nicht nur für diesen Zugriff.
+
+Aufruf:
+    python3 i2c_discovery.py [ADRESSE]    # gibt die Bus-Nummer aus, Exit 1 wenn nicht gefunden
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SYSFS_I2C = "/sys/bus/i2c/devices"
+STATE_FILE = "/var/lib/tco-watchdog/i2c.json"
+
+# ioctl Konstanten aus linux/i2c-dev.h
+I2C_SLAVE = 0x0703
+
+PROBE_TIMEOUT = 1.0           # Sekunden für alle Lesezugriffe zusammen
+
+# Adapter dieser Treiber werden zuerst geprüft (DesignWare = Fitlet3 Header)
+PREFERRED_ADAPTERS = ("designware",)
+
+
+def list_adapters(sysfs=SYSFS_I2C):
+    """Bus-Nummer -> Adaptername aus /sys/bus/i2c/devices/i2c-N/name"""
+    adapters = {}
+    try:
+        entries = os.listdir(sysfs)
+    except FileNotFoundError:
+        return adapters
+
+    for entry in entries:
+        if not entry.startswith("i2c-") or not entry[4:].isdigit():
+            continue
+        try:
+            with open(os.path.join(sysfs, entry, "name")) as f:
+                adapters[int(entry[4:])] = f.read().strip()
+        except OSError:
+            adapters[int(entry[4:])] = ""
+    return adapters
+
+
+def probe(bus, address):
+    """Ein einzelner Lesezugriff - True wenn ein Gerät mit ACK antwortet"""
+    try:
+        fd = os.open(f"/dev/i2c-{bus}", os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        fcntl.ioctl(fd, I2C_SLAVE, address)
+        os.read(fd, 1)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def probe_all(candidates, timeout=PROBE_TIMEOUT):
+    """
+    (Bus, Adresse)-Paare parallel prüfen und die antwortenden liefern
+    Ein hängender Adapter zählt nach timeout als nicht gefunden; sein Daemon-Thread
+    hält weder den Aufrufer noch das Beenden des Prozesses auf
+    """
+    results = {}
+
+    def run(candidate):
+        results[candidate] = probe(*candidate)
+
+    threads = [threading.Thread(target=run, args=(candidate,), daemon=True,
+                                name=f"i2c-probe-{candidate[0]}") for candidate in candidates]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+
+    found = []
+    for candidate, thread in zip(candidates, threads):
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            logger.warning("i2c-%s antwortet nicht innerhalb von %gs", candidate[0], timeout)
+        elif results.get(candidate):
+            found.append(candidate)
+    return found
+
+
+def discover(addresses=(0x20,), adapters=None, timeout=PROBE_TIMEOUT):
+    """Alle (Bus, Adresse) mit Antwort - alle Busse parallel geprüft"""
+    if adapters is None:
+        adapters = list_adapters()
+    buses = sorted(adapters, key=lambda b: (not any(p in adapters[b].lower()
+                                                     for p in PREFERRED_ADAPTERS), b))
+    return probe_all([(bus, addr) for bus in buses for addr in addresses], timeout)
+
+
+def load_state(state_file=STATE_FILE):
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state, state_file=STATE_FILE):
+    """Atomar schreiben, damit ein Absturz keine halbe Datei hinterlässt"""
+    try:
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        tmp = f"{state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp, state_file)
+    except OSError as e:
+        logger.warning("I2C-Statusdatei %s nicht schreibbar: %s", state_file, e)
+
+
+def find_expander(address=0x20, state_file=STATE_FILE):
+    """
+    Bus-Nummer des PCA9555 liefern (None wenn nicht gefunden)
+    Gemerkter Bus wird nur übernommen, wenn Adaptername und Antwort noch passen
+    """
+    adapters = list_adapters()
+    state = load_state(state_file)
+
+    if state and state.get("address") == address:
+        bus = state.get("bus")
+        if adapters.get(bus) == state.get("adapter") and probe_all([(bus, address)]):
+            return bus
+
+        # Bus umnummeriert: gleichen Adapternamen zuerst versuchen
+        same = [(b, address) for b, name in adapters.items() if name == state.get("adapter")]
+        for bus, _ in probe_all(same):
+            logger.info("PCA9555 von i2c-%s nach i2c-%s gewandert", state.get('bus'), bus)
+            save_state({"bus": bus, "address": address, "adapter": adapters[bus]}, state_file)
+            return bus
+
+    found = discover((address,), adapters)
+    if not found:
+        return None
+
+    bus = found[0][0]
+    save_state({"bus": bus, "address": address, "adapter": adapters.get(bus, "")}, state_file)
+    return bus
+
+
+def main():
+    address = int(sys.argv[1], 0) if len(sys.argv) > 1 else 0x20
+    bus = find_expander(address)
+    if bus is None:
+        return 1
+    print(bus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -27,10 +27,15 @@ fi
 
 # 4. Script installieren
 echo "Installiere TCO Watchdog Script..."
-cp tco-watchdog.py /usr/local/bin/
+cp tco-watchdog.py tco_heartbeat.py i2c_discovery.py tco_journal.py tco_realtime.py tco_i2c.py tco_pretimeout.py \
+   tco_clock.py tco_inputs.py tco_kmsg.py tco_soak.py /usr/local/bin/
 chmod +x /usr/local/bin/tco-watchdog.py
 echo "✓ Script nach /usr/local/bin/ kopiert"
 
+# Nur Mitglieder dieser Gruppe dürfen Anwendungs-Heartbeats anlegen
+groupadd --system -f tco-heartbeat
+echo "✓ Gruppe tco-heartbeat angelegt (Anwendungs-Benutzer mit 'usermod -aG tco-heartbeat' aufnehmen)"
+
 # 5. Service installieren
 echo "Installiere Systemd Service..."
 cp tco-watchdog.service /etc/systemd/system/
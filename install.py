@@ -150,17 +150,30 @@ test_i2c_efi() {
     # Warte kurz auf Hardware-Initialisierung
     sleep 2
     
-    # Teste verschiedene Busse
-    for bus in 0 1 2 3; do
-        if [ -e "/dev/i2c-$bus" ]; then
-            print_info "Teste Bus $bus..."
-            if timeout 5 i2cdetect -y "$bus" 2>/dev/null | grep -q "20"; then
-                print_success "PCA9555 gefunden auf Bus $bus!"
-                FOUND_BUS=$bus
-                return 0
-            fi
+    # Bevorzugt: i2c_discovery.py (sysfs-Adapter, paralleler Einzel-Lesezugriff, Cache)
+    DISCOVERY="$(dirname "$0")/i2c_discovery.py"
+    if [ -f "$DISCOVERY" ]; then
+        if FOUND_BUS=$(python3 "$DISCOVERY" 0x20); then
+            print_success "PCA9555 gefunden auf Bus $FOUND_BUS!"
+            return 0
         fi
-    done
+    else
+        # Nur Adresse 0x20 auf allen Bussen gleichzeitig prüfen
+        RESULT_DIR=$(mktemp -d)
+        for dev in /dev/i2c-*; do
+            [ -e "$dev" ] || continue
+            bus=${dev#/dev/i2c-}
+            ( timeout 2 i2cdetect -y -r "$bus" 0x20 0x20 2>/dev/null | grep -q " 20" \
+                && touch "$RESULT_DIR/$bus" ) &
+        done
+        wait
+        FOUND_BUS=$(ls "$RESULT_DIR" | sort -n | head -n 1)
+        rm -rf "$RESULT_DIR"
+        if [ -n "$FOUND_BUS" ]; then
+            print_success "PCA9555 gefunden auf Bus $FOUND_BUS!"
+            return 0
+        fi
+    fi
     
     print_error "PCA9555 nicht gefunden!"
     print_info "Verfügbare I2C Busse:"
@@ -294,6 +307,8 @@ if __name__ == "__main__":
     switch_service.run()
 EOF
 
+    # Gefundenen Bus statt fest eingetragenem Bus 3 verwenden
+    sed -i "s/smbus.SMBus(3)/smbus.SMBus(${FOUND_BUS:-3})/" /usr/local/bin/fitlet3-status-switch.py
     chmod +x /usr/local/bin/fitlet3-status-switch.py
 }
 
@@ -6,13 +6,24 @@ Nutzt den eingebauten Hardware-Watchdog des Intel Chipsets
 
 import os
 import time
+import errno
 import signal
 import sys
 import logging
 import subprocess
 import threading
-import smbus
+import configparser
+from collections import deque
 from pathlib import Path
+from tco_heartbeat import HeartbeatMonitor, HEARTBEAT_DIR
+from tco_clock import SystemClock
+from tco_inputs import InputEventBus
+from tco_kmsg import KmsgReader
+from i2c_discovery import find_expander
+import tco_journal
+import tco_realtime
+import tco_pretimeout
+from tco_i2c import I2CWorker, HEALTH_OK
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -23,15 +34,31 @@ class IntelTCOWatchdog:
     Nutzt den eingebauten Hardware-Watchdog des Intel Chipsets
     """
     
-    def __init__(self, bus_num=3, pca_address=0x20):
+    def __init__(self, bus_num=None, pca_address=0x20, clock=None, bus=None,
+                 heartbeat_dir=HEARTBEAT_DIR, dump_file=tco_pretimeout.DUMP_FILE):
         self.watchdog_device = "/dev/watchdog"
         self.watchdog_fd = None
         self.running = True
+        self.clock = clock or SystemClock()
         
-        # PCA9555 für Schalter-Integration
-        self.bus = smbus.SMBus(bus_num)
+        # PCA9555 für Schalter-Integration (Bus automatisch suchen, falls nicht vorgegeben)
+        if bus is None and bus_num is None:
+            bus_num = find_expander(pca_address)
+            if bus_num is None:
+                logger.warning("PCA9555 (0x%02x) nicht gefunden - verwende Bus 3", pca_address)
+                bus_num = 3
+            else:
+                logger.info("PCA9555 (0x%02x) auf i2c-%s", pca_address, bus_num)
         self.pca_addr = pca_address
         
+        # Alle Expander-Zugriffe über den I2C-Worker (eigener Prozess, begrenzte Queue)
+        self.i2c = I2CWorker(pca_address, bus_num=bus_num, bus=bus, clock=self.clock)
+        self.i2c.start()
+        self.i2c_health = self.i2c.health
+        self.i2c_errors = 0           # Zuletzt gemeldeter Fehlerstand des Workers
+        self.hardware_ready = False   # PCA9555-Setup erfolgreich (sonst später wiederholen)
+        self.hardware_retry = self.clock.monotonic()
+        
         # Pin-Konfiguration für PCA9555
         self.SWITCH_PORT = 1
         self.SWITCH_PIN = 7           # Pin 1.7 - Reset-Schalter
@@ -40,16 +67,52 @@ class IntelTCOWatchdog:
         self.HEARTBEAT_PORT = 1
         self.HEARTBEAT_PIN = 3        # Pin 1.3 - Heartbeat-LED
         
+        # Eingänge (alle 16 Pins aus einem Snapshot)
+        self.config_file = "/etc/tco-watchdog.conf"
+        self.inputs = InputEventBus(self.read_inputs, self.clock)
+        self.input_hooks = []         # Konfigurierte [input X.Y] Sektionen
+        self.feed_gates = 0           # Bitmaske der Eingänge mit action = gate
+        self.feed_gate_active = 0     # Welche Gates aktuell das Füttern sperren
+        self.output_state = {}        # Zuletzt gesetzte Pegel je (port, pin)
+        
+        # Kernel-Meldungen (iTCO/Watchdog/I2C) aus /dev/kmsg - nur ab Start des Daemons,
+        # ältere (Ringpuffer ab Boot, z.B. nach Restart=always) werden nur gezählt
+        self.kernel_events = {'watchdog': 0, 'i2c': 0, 'errors': 0, 'warnings': 0, 'before_start': 0}
+        self.kernel_events_reported = dict(self.kernel_events)
+        self.kmsg_since = time.monotonic()    # Sekunden seit Boot wie die kmsg-Zeitstempel
+        
+        # Anwendungs-Heartbeats (Shared Memory, siehe tco_heartbeat.py)
+        self.heartbeats = HeartbeatMonitor(heartbeat_dir)
+        self.heartbeats.setup()
+        
         # Watchdog-Einstellungen
         self.timeout = 30             # 30 Sekunden Timeout
         self.heartbeat_interval = 10  # Alle 10 Sekunden füttern
-        self.last_feed = time.time()
+        self.last_feed = self.clock.time()
+        self.last_feed_monotonic = self.clock.monotonic()  # Für den Pretimeout - unabhängig von NTP
         
         # Schalter-Reset Einstellungen
         self.reset_hold_time = 5      # 5 Sekunden für manuellen Reset
         self.last_switch_state = None
         self.switch_press_start = None
         
+        # Echtzeit-Modus für den Feed-Kontext (opt-in über [realtime])
+        self.realtime = {'enabled': False, 'priority': 50, 'cpu': None, 'prefault_kb': 1024}
+        
+        # Pretimeout: Zustand sichern, bevor der Watchdog das Board zurücksetzt
+        self.pretimeout = 10          # Sekunden vor Ablauf des Timeouts
+        self.hw_pretimeout = False    # Treiber meldet den Pretimeout selbst (kmsg)
+        self.watchdog_name = None     # z.B. watchdog0 - nur dessen Pretimeout-Meldungen zählen
+        self.dump = tco_pretimeout.EmergencyDump(dump_file)
+        self.dump_feed = None         # last_feed_monotonic, zu dem schon gesichert wurde
+        self.feed_history = deque(maxlen=64)  # (Zeit, Abstand zum vorigen Feed)
+        self.feed_block_reason = None # Warum zuletzt nicht gefüttert wurde
+        
+        config = self.read_config()
+        self.load_input_config(config)
+        self.load_realtime_config(config)
+        self.load_pretimeout_config(config)
+        self.setup_emergency_dump()
         self.setup_hardware()
         self.setup_tco_watchdog()
     
@@ -58,24 +121,48 @@ class IntelTCOWatchdog:
         try:
             logger.info("Konfiguriere PCA9555 für TCO Watchdog...")
             
-            # Pin-Konfiguration
-            config = self.bus.read_byte_data(self.pca_addr, 0x07)
-            config |= (1 << self.SWITCH_PIN)      # Switch als Input
-            config &= ~(1 << self.STATUS_LED_PIN) # Status-LED als Output
-            config &= ~(1 << self.HEARTBEAT_PIN)  # Heartbeat-LED als Output
-            self.bus.write_byte_data(self.pca_addr, 0x07, config)
+            # Erst wenn der Worker-Prozess läuft - sonst laufen die Deadlines schon beim Start ab
+            if not self.i2c.wait_ready(10.0):
+                raise TimeoutError(errno.ETIMEDOUT, "I2C-Worker nicht bereit")
             
-            # Initial-Werte
-            output = self.bus.read_byte_data(self.pca_addr, 0x03)
-            output |= (1 << self.STATUS_LED_PIN)   # Status-LED EIN
-            output &= ~(1 << self.HEARTBEAT_PIN)   # Heartbeat-LED AUS
-            self.bus.write_byte_data(self.pca_addr, 0x03, output)
+            # Pin-Konfiguration (Bit = 1: Input, 0: Output)
+            inputs = {0: 0, 1: 1 << self.SWITCH_PIN}                         # Switch als Input
+            outputs = {0: 0, 1: (1 << self.STATUS_LED_PIN) | (1 << self.HEARTBEAT_PIN)}  # LEDs
             
+            # Konfigurierte Eingänge / Toggle-Ausgänge
+            for hook in self.input_hooks:
+                inputs[hook['port']] |= (1 << hook['pin'])
+                if hook['output']:
+                    outputs[hook['output'][0]] |= (1 << hook['output'][1])
+            
+            for port in (0, 1):
+                self.i2c.call('update_bits', 0x06 + port, inputs[port] | outputs[port], inputs[port],
+                              timeout=1.0)
+            
+            # Initial-Werte: Status-LED EIN, Heartbeat-LED AUS
+            self.i2c.call('update_bits', 0x03,
+                          (1 << self.STATUS_LED_PIN) | (1 << self.HEARTBEAT_PIN),
+                          (1 << self.STATUS_LED_PIN), timeout=1.0)
+            self.output_state[(self.STATUS_LED_PORT, self.STATUS_LED_PIN)] = True
+            self.output_state[(self.HEARTBEAT_PORT, self.HEARTBEAT_PIN)] = False
+            
+            self.hardware_ready = True
             logger.info("PCA9555 Hardware-Setup abgeschlossen")
             
         except Exception as e:
-            logger.error(f"PCA9555 Setup fehlgeschlagen: {e}")
-            # Weiter ohne PCA9555
+            logger.error("PCA9555 Setup fehlgeschlagen: %s", e)
+            # Weiter ohne PCA9555 - der Heartbeat-Thread versucht es erneut
+    
+    def retry_hardware_setup(self, interval=30):
+        """PCA9555-Setup wiederholen, sobald der Bus wieder antwortet (höchstens alle interval s)"""
+        now = self.clock.monotonic()
+        if self.hardware_ready or self.i2c_health != HEALTH_OK or now - self.hardware_retry < interval:
+            return
+        # Neu gestarteter Worker noch ohne Handshake: nicht warten, nächste Runde erneut prüfen
+        if not self.i2c.wait_ready(0):
+            return
+        self.hardware_retry = now
+        self.setup_hardware()
     
     def setup_tco_watchdog(self):
         """Intel TCO Watchdog initialisieren"""
@@ -87,23 +174,24 @@ class IntelTCOWatchdog:
             
             # Watchdog-Device öffnen
             if not os.path.exists(self.watchdog_device):
-                logger.error(f"Watchdog-Device {self.watchdog_device} nicht gefunden!")
+                logger.error("Watchdog-Device %s nicht gefunden!", self.watchdog_device)
                 raise FileNotFoundError(f"Watchdog-Device nicht verfügbar")
             
             # Watchdog öffnen (startet automatisch den Timer!)
             self.watchdog_fd = os.open(self.watchdog_device, os.O_WRONLY)
-            logger.info(f"TCO Watchdog geöffnet: {self.watchdog_device}")
+            logger.info("TCO Watchdog geöffnet: %s", self.watchdog_device)
             
             # Timeout setzen
             self.set_timeout(self.timeout)
+            self.setup_pretimeout()
             
             # Initial füttern
             self.feed_watchdog()
             
-            logger.info(f"Intel TCO Watchdog aktiv (Timeout: {self.timeout}s)")
+            logger.info("Intel TCO Watchdog aktiv (Timeout: %ss)", self.timeout)
             
         except Exception as e:
-            logger.error(f"TCO Watchdog Setup fehlgeschlagen: {e}")
+            logger.error("TCO Watchdog Setup fehlgeschlagen: %s", e)
             raise
     
     def check_tco_module(self):
@@ -125,13 +213,13 @@ class IntelTCOWatchdog:
             if result.returncode == 0:
                 for line in result.stdout.split('\n'):
                     if 'description:' in line.lower():
-                        logger.info(f"TCO Modul: {line.strip()}")
+                        logger.info("TCO Modul: %s", line.strip())
                         break
             
         except subprocess.CalledProcessError as e:
-            logger.warning(f"Konnte iTCO_wdt Modul nicht laden: {e}")
+            logger.warning("Konnte iTCO_wdt Modul nicht laden: %s", e)
         except Exception as e:
-            logger.warning(f"Modul-Check Fehler: {e}")
+            logger.warning("Modul-Check Fehler: %s", e)
     
     def set_timeout(self, timeout_seconds):
         """Watchdog-Timeout setzen"""
@@ -148,10 +236,83 @@ class IntelTCOWatchdog:
                 timeout_bytes = struct.pack('I', timeout_seconds)
                 fcntl.ioctl(self.watchdog_fd, WDIOC_SETTIMEOUT, timeout_bytes)
                 
-                logger.info(f"Watchdog-Timeout auf {timeout_seconds}s gesetzt")
+                logger.info("Watchdog-Timeout auf %ss gesetzt", timeout_seconds)
                 
         except Exception as e:
-            logger.warning(f"Konnte Timeout nicht setzen: {e}")
+            logger.warning("Konnte Timeout nicht setzen: %s", e)
+    
+    def setup_pretimeout(self):
+        """Hardware-Pretimeout setzen - ohne Treiberunterstützung bleibt die Software-Prüfung"""
+        try:
+            sysfs = tco_pretimeout.sysfs_path(self.watchdog_device)
+            self.watchdog_name = os.path.basename(sysfs)
+            self.hw_pretimeout = tco_pretimeout.set_pretimeout(self.watchdog_fd, self.pretimeout, sysfs)
+            if self.hw_pretimeout:
+                logger.info("Hardware-Pretimeout auf %ss gesetzt",
+                            tco_pretimeout.get_pretimeout(self.watchdog_fd))
+            else:
+                logger.info("Kein Hardware-Pretimeout (Treiber oder Governor 'noop' fehlt) - "
+                            "Software-Prüfung %ss vor Ablauf", self.pretimeout)
+        except OSError as e:
+            self.hw_pretimeout = False
+            logger.warning("Pretimeout nicht setzbar (%s) - Software-Prüfung", e)
+    
+    def setup_emergency_dump(self):
+        """Notfall-Datei anlegen und ein Abbild vom letzten Lauf melden"""
+        try:
+            previous = self.dump.open()
+        except OSError as e:
+            logger.warning("Pretimeout-Datei %s nicht verfügbar: %s", self.dump.path, e)
+            return
+        if previous:
+            i2c = previous.get('i2c', {})
+            logger.warning("Notfall-Abbild vom letzten Lauf (%s): %.1fs ohne Feed, Grund: %s, "
+                           "I2C %s (%s Fehler) - Abbild in %s.prev",
+                           previous.get('source'), previous.get('since_feed_s', 0),
+                           previous.get('feed_block_reason'), i2c.get('health'),
+                           i2c.get('errors'), self.dump.path,
+                           extra={'EVENT': 'pretimeout_previous'})
+    
+    def emergency_state(self, source):
+        """Feed-Historie, letzte Zustände und I2C-Fehlerstand für das Notfall-Abbild"""
+        return {
+            'source': source,
+            'time': self.clock.time(),
+            'since_feed_s': round(self.clock.monotonic() - self.last_feed_monotonic, 3),
+            'timeout_s': self.timeout,
+            'pretimeout_s': self.pretimeout,
+            'feed_block_reason': self.feed_block_reason,
+            'feed_gate_active': self.feed_gate_active,
+            'feed_history': list(self.feed_history),
+            'heartbeat_clients': {name: {'pid': c['pid'], 'stale': c['stale']}
+                                  for name, c in list(self.heartbeats.clients.items())},
+            'i2c': {'health': self.i2c_health, 'errors': self.i2c.errors,
+                    'last_errno': self.i2c.last_errno, 'dropped': self.i2c.dropped},
+            'kernel_events': dict(self.kernel_events),
+        }
+    
+    def emergency_flush(self, source):
+        """Zustand einmal pro ausgebliebenem Feed sichern - True wenn geschrieben"""
+        if self.dump_feed == self.last_feed_monotonic:
+            return False
+        self.dump_feed = self.last_feed_monotonic
+        try:
+            elapsed = self.dump.write(self.emergency_state(source))
+        except Exception as e:
+            logger.error("Pretimeout-Abbild fehlgeschlagen: %s", e, extra={'EVENT': 'pretimeout'})
+            return False
+        if elapsed is None:
+            return False
+        # Erst nach dem Sichern loggen - das Abbild hat Vorrang
+        logger.critical("Pretimeout (%s): Zustand in %.1f ms nach %s gesichert",
+                        source, elapsed * 1000, self.dump.path, extra={'EVENT': 'pretimeout'})
+        return True
+    
+    def check_pretimeout(self):
+        """Software-Pretimeout: Feed überfällig -> sichern, solange noch Zeit ist"""
+        # Monotone Zeit: ein NTP-Sprung darf weder ein Abbild auslösen noch eines verhindern
+        if self.clock.monotonic() - self.last_feed_monotonic >= self.timeout - self.pretimeout:
+            self.emergency_flush('software')
     
     def feed_watchdog(self):
         """Watchdog füttern (Keep-Alive)"""
@@ -159,11 +320,19 @@ class IntelTCOWatchdog:
             if self.watchdog_fd:
                 # Beliebiges Byte schreiben = Watchdog füttern
                 os.write(self.watchdog_fd, b'1')
-                self.last_feed = time.time()
-                logger.debug("TCO Watchdog gefüttert")
+                now = self.clock.time()
+                now_monotonic = self.clock.monotonic()
+                elapsed = now_monotonic - self.last_feed_monotonic
+                if logger.isEnabledFor(logging.DEBUG):
+                    margin_ms = int((self.timeout - elapsed) * 1000)
+                    logger.debug("TCO Watchdog gefüttert (Reserve %d ms)", margin_ms,
+                                 extra={'EVENT': 'feed', 'FEED_MARGIN_MS': margin_ms})
+                self.feed_history.append((round(now, 3), round(elapsed, 3)))
+                self.last_feed = now
+                self.last_feed_monotonic = now_monotonic
                 return True
         except Exception as e:
-            logger.error(f"Watchdog-Feed Fehler: {e}")
+            logger.error("Watchdog-Feed Fehler: %s", e, extra={'EVENT': 'feed_error'})
             return False
     
     def trigger_immediate_reset(self):
@@ -172,6 +341,8 @@ class IntelTCOWatchdog:
         
         try:
             if self.watchdog_fd:
+                self.emergency_flush('switch')
+                
                 # Watchdog schließen ohne Magic Close
                 # Das löst einen sofortigen Reset aus!
                 logger.critical("Schließe Watchdog ohne Magic Close...")
@@ -180,13 +351,13 @@ class IntelTCOWatchdog:
                 
                 # Warten auf Reset (sollte in wenigen Sekunden erfolgen)
                 logger.critical("Warte auf Hardware-Reset...")
-                time.sleep(10)
+                self.clock.sleep(10)
                 
                 # Falls wir hier ankommen, hat der Reset nicht funktioniert
                 logger.error("TCO Watchdog Reset fehlgeschlagen!")
                 
         except Exception as e:
-            logger.error(f"TCO Reset Fehler: {e}")
+            logger.error("TCO Reset Fehler: %s", e)
     
     def stop_watchdog_safely(self):
         """Watchdog sicher stoppen (Magic Close)"""
@@ -200,85 +371,301 @@ class IntelTCOWatchdog:
                 logger.info("TCO Watchdog sicher gestoppt")
                 
         except Exception as e:
-            logger.error(f"Watchdog-Stop Fehler: {e}")
+            logger.error("Watchdog-Stop Fehler: %s", e)
     
-    def read_switch(self):
-        """Reset-Schalter lesen"""
+    def read_inputs(self):
+        """Snapshot beider Input-Ports (0x00/0x01) in einer Bus-Transaktion"""
         try:
-            data = self.bus.read_byte_data(self.pca_addr, 0x01)
-            return not bool(data & (1 << self.SWITCH_PIN))  # NC-Schalter invertiert
-        except:
+            # Word-Read: Low-Byte = Port 0, High-Byte = Port 1
+            return self.i2c.call('read_word_data', 0x00) & 0xFFFF
+        except Exception as e:
+            logger.error("I2C-Lesefehler (Inputs): %s", e,
+                         extra={'EVENT': 'i2c_error', 'I2C_ERRNO': getattr(e, 'errno', None)})
+            return None
+    
+    def read_switch(self):
+        """Reset-Schalter aus dem letzten Snapshot lesen"""
+        level = self.inputs.get(self.SWITCH_PORT, self.SWITCH_PIN)
+        if level is None:
             return False
+        return not level  # NC-Schalter invertiert
     
-    def set_pin(self, port, pin, value):
-        """PCA9555 Pin setzen"""
+    def read_config(self):
+        """Konfigurationsdatei lesen (leer, wenn nicht vorhanden oder fehlerhaft)"""
+        # Kommentare auch hinter Werten ("action = log  ; ...") wie in der README
+        parser = configparser.ConfigParser(inline_comment_prefixes=(';', '#'))
         try:
-            reg = 0x02 if port == 0 else 0x03
-            output = self.bus.read_byte_data(self.pca_addr, reg)
-            
-            if value:
-                output |= (1 << pin)
+            parser.read(self.config_file)
+        except configparser.Error as e:
+            logger.warning("Konfiguration %s fehlerhaft: %s", self.config_file, e)
+            return configparser.ConfigParser()
+        return parser
+    
+    def load_realtime_config(self, parser):
+        """[realtime] Sektion: enabled, priority, cpu, prefault_kb"""
+        if not parser.has_section('realtime'):
+            return
+        opts = parser['realtime']
+        try:
+            self.realtime['enabled'] = opts.getboolean('enabled', False)
+            self.realtime['priority'] = opts.getint('priority', 50)
+            self.realtime['prefault_kb'] = opts.getint('prefault_kb', 1024)
+            cpu = opts.get('cpu')
+            self.realtime['cpu'] = int(cpu) if cpu not in (None, '') else None
+            if not 1 <= self.realtime['priority'] <= 99:
+                raise ValueError(f"priority {self.realtime['priority']} nicht in 1..99")
+        except ValueError as e:
+            # Nicht still abschalten: wer [realtime] einträgt, erwartet den Echtzeit-Modus
+            logger.error("Konfiguration [realtime] ungültig (%s) - Echtzeit-Modus aus", e)
+            self.realtime['enabled'] = False
+    
+    def load_pretimeout_config(self, parser):
+        """[pretimeout] Sektion: seconds, file"""
+        if not parser.has_section('pretimeout'):
+            return
+        opts = parser['pretimeout']
+        try:
+            seconds = opts.getint('seconds', self.pretimeout)
+            if not 0 < seconds < self.timeout:
+                raise ValueError(f"seconds {seconds} nicht in 1..{self.timeout - 1}")
+            self.pretimeout = seconds
+        except ValueError as e:
+            logger.warning("Konfiguration [pretimeout] ignoriert: %s", e)
+        if opts.get('file'):
+            self.dump = tco_pretimeout.EmergencyDump(opts.get('file'))
+    
+    @staticmethod
+    def parse_pin(text):
+        """'X.Y' -> (Port, Pin) mit Bereichsprüfung"""
+        port, pin = (int(x) for x in text.split('.'))
+        if port not in (0, 1) or not 0 <= pin <= 7:
+            raise ValueError(f"Pin {port}.{pin} ungültig")
+        return port, pin
+    
+    def load_input_config(self, parser):
+        """[input X.Y] Sektionen aus der Konfigurationsdatei laden"""
+        leds = ((self.STATUS_LED_PORT, self.STATUS_LED_PIN),
+                (self.HEARTBEAT_PORT, self.HEARTBEAT_PIN))
+        hooks = []
+        for section in parser.sections():
+            if not section.startswith('input '):
+                continue
+            try:
+                port, pin = self.parse_pin(section.split()[1])
+                if (port, pin) in leds:
+                    raise ValueError(f"Pin {port}.{pin} ist als LED belegt")
+                
+                opts = parser[section]
+                action = opts.get('action', 'log')
+                if action not in ('log', 'command', 'gate', 'toggle'):
+                    raise ValueError(f"Unbekannte Aktion '{action}'")
+                
+                output = None
+                if action == 'toggle':
+                    output = self.parse_pin(opts['output'])
+                    if output in leds:
+                        raise ValueError(f"Ausgang {output[0]}.{output[1]} ist als LED belegt")
+                    if output == (self.SWITCH_PORT, self.SWITCH_PIN):
+                        raise ValueError(f"Ausgang {output[0]}.{output[1]} ist der Reset-Schalter")
+                if action == 'command' and not opts.get('command'):
+                    raise ValueError("command fehlt")
+                edge = opts.get('edge', 'rising' if action == 'toggle' else 'both')
+                if edge not in ('both', 'rising', 'falling'):
+                    raise ValueError(f"Unbekannte Flanke '{edge}'")
+                
+                hook = {
+                    'name': opts.get('name', f"Eingang {port}.{pin}"),
+                    'port': port,
+                    'pin': pin,
+                    'action': action,
+                    'active_low': opts.getboolean('active_low', False),
+                    'edge': edge,
+                    'command': opts.get('command'),
+                    'output': output,
+                    'section': section,
+                }
+                hooks.append(hook)
+                
+            except (ValueError, KeyError) as e:
+                logger.warning("Konfiguration [%s] ignoriert: %s", section, e)
+        
+        # Toggle-Ausgänge dürfen keinen konfigurierten Eingang umschalten
+        input_pins = {(hook['port'], hook['pin']) for hook in hooks}
+        for hook in hooks:
+            port, pin = hook['port'], hook['pin']
+            if hook['output'] in input_pins:
+                logger.warning("Konfiguration [%s] ignoriert: Ausgang %s.%s ist als Eingang konfiguriert",
+                               hook['section'], *hook['output'])
+                continue
+            self.input_hooks.append(hook)
+            self.inputs.subscribe(lambda event, hook=hook: self.handle_input_hook(hook, event),
+                                  mask=1 << (port * 8 + pin))
+            if hook['action'] == 'gate':
+                self.feed_gates |= 1 << (port * 8 + pin)
+            logger.info("Input-Hook: %s (Pin %s.%s) -> %s", hook['name'], port, pin, hook['action'])
+    
+    def handle_input_hook(self, hook, event):
+        """Konfigurierte Aktion für einen geänderten Eingang ausführen"""
+        active = event.value != hook['active_low']
+        bit = 1 << event.bit
+        
+        # Gate: Füttern sperren solange der Eingang aktiv ist (auch beim ersten Snapshot)
+        if hook['action'] == 'gate':
+            if active and not self.feed_gate_active & bit:
+                logger.warning("%s aktiv - Watchdog-Feed gesperrt", hook['name'])
+            elif not active and self.feed_gate_active & bit:
+                logger.info("%s inaktiv - Watchdog-Feed freigegeben", hook['name'])
+            if active:
+                self.feed_gate_active |= bit
             else:
-                output &= ~(1 << pin)
-            
-            self.bus.write_byte_data(self.pca_addr, reg, output)
-            
-        except:
-            pass  # Ignoriere PCA9555 Fehler
+                self.feed_gate_active &= ~bit
+            return
+        
+        if event.initial:
+            logger.info("%s: %s", hook['name'], 'aktiv' if active else 'inaktiv')
+            return
+        if hook['edge'] == 'rising' and not active:
+            return
+        if hook['edge'] == 'falling' and active:
+            return
+        
+        if hook['action'] == 'log':
+            logger.info("%s: %s", hook['name'], 'aktiv' if active else 'inaktiv')
+        
+        elif hook['action'] == 'command':
+            env = dict(os.environ,
+                       INPUT_NAME=hook['name'],
+                       INPUT_PIN=f"{event.port}.{event.pin}",
+                       INPUT_ACTIVE='1' if active else '0')
+            logger.info("%s: starte '%s'", hook['name'], hook['command'])
+            # Nicht blockieren - der Monitor-Thread muss weiter abtasten
+            threading.Thread(target=subprocess.run, args=(hook['command'],),
+                             kwargs={'shell': True, 'env': env}, daemon=True).start()
+        
+        elif hook['action'] == 'toggle':
+            out_port, out_pin = hook['output']
+            value = not self.output_state.get((out_port, out_pin), False)
+            self.set_pin(out_port, out_pin, value)
+            logger.info("%s: Ausgang %s.%s -> %s", hook['name'], out_port, out_pin, 'EIN' if value else 'AUS')
+    
+    def set_pin(self, port, pin, value):
+        """PCA9555 Pin setzen - nur einreihen, nie auf den Bus warten"""
+        reg = 0x02 if port == 0 else 0x03
+        if self.i2c.submit('update_bits', reg, 1 << pin, (1 << pin) if value else 0):
+            self.output_state[(port, pin)] = bool(value)
+        else:
+            logger.warning("I2C-Queue voll - Pin %s.%s nicht gesetzt", port, pin,
+                           extra={'EVENT': 'i2c_queue_full'})
+    
+    def check_i2c_health(self):
+        """Watchdog für den I2C-Worker: Zustandswechsel und neue Fehler melden"""
+        health = self.i2c.check_health()
+        if health != self.i2c_health:
+            level = logging.INFO if health == HEALTH_OK else logging.ERROR
+            logger.log(level, "I2C-Bus Zustand: %s -> %s", self.i2c_health, health,
+                       extra={'EVENT': 'i2c_health', 'I2C_HEALTH': health,
+                              'I2C_ERRNO': self.i2c.last_errno})
+            self.i2c_health = health
+        
+        if self.i2c.errors != self.i2c_errors:
+            logger.error("I2C-Fehler: %s neue (errno %s)", self.i2c.errors - self.i2c_errors,
+                         self.i2c.last_errno,
+                         extra={'EVENT': 'i2c_error', 'I2C_ERRNO': self.i2c.last_errno})
+            self.i2c_errors = self.i2c.errors
+        return health
     
     def heartbeat_thread(self):
-        """Heartbeat-Thread für LED und Watchdog-Feed"""
+        """
+        Heartbeat-LED blinken, I2C-Worker überwachen, Heartbeat-Clients aufnehmen und
+        Software-Pretimeout prüfen (normale Priorität, getrennt vom Feed - bemerkt auch
+        einen hängenden Feed-Thread)
+        """
         heartbeat_state = False
-        last_feed = time.time()
         
         while self.running:
             try:
-                current_time = time.time()
-                
-                # Heartbeat-LED blinken
                 self.set_pin(self.HEARTBEAT_PORT, self.HEARTBEAT_PIN, heartbeat_state)
                 heartbeat_state = not heartbeat_state
+                self.check_i2c_health()
+                self.retry_hardware_setup()
+                self.heartbeats.scan(self.clock.monotonic())  # Verzeichnis lesen, nicht im Feed-Pfad
+                self.check_pretimeout()
+                self.clock.sleep(1)  # 1 Sekunde Heartbeat
                 
-                # Watchdog regelmäßig füttern
+            except Exception as e:
+                logger.error("Heartbeat-Thread Fehler: %s", e)
+                self.clock.sleep(1)
+    
+    def feed_thread(self):
+        """Watchdog-Feed - im Echtzeit-Modus mit SCHED_FIFO auf fester CPU"""
+        if self.realtime['enabled']:
+            try:
+                tco_realtime.enter_realtime(self.realtime['priority'], self.realtime['cpu'])
+                logger.info("Feed-Thread: SCHED_FIFO Priorität %s%s", self.realtime['priority'],
+                            f", CPU {self.realtime['cpu']}" if self.realtime['cpu'] is not None else "")
+            except Exception as e:
+                logger.error("Echtzeit-Modus für Feed-Thread fehlgeschlagen: %s", e)
+        
+        last_feed = self.clock.monotonic()
+        
+        while self.running:
+            try:
+                current_time = self.clock.monotonic()  # Zurückgestellte Uhr darf das Füttern nicht aussetzen
+                
+                # Watchdog regelmäßig füttern (außer ein Gate-Eingang sperrt
+                # oder ein registrierter Anwendungs-Heartbeat steht)
+                # Der Grund für ein ausbleibendes Feed landet im Pretimeout-Abbild
                 if current_time - last_feed >= self.heartbeat_interval:
-                    if self.feed_watchdog():
-                        last_feed = current_time
-                        logger.debug(f"Watchdog gefüttert (nächstes Feed in {self.heartbeat_interval}s)")
+                    if self.feed_gate_active:
+                        self.feed_block_reason = f"gate 0x{self.feed_gate_active:04x}"
                     else:
-                        logger.error("Watchdog-Feed fehlgeschlagen!")
+                        stale = self.heartbeats.check(self.clock.monotonic())
+                        if stale:
+                            self.feed_block_reason = f"heartbeat: {', '.join(stale)}"
+                            logger.error("Kein Feed - Anwendung hängt: %s", ', '.join(stale))
+                        elif self.feed_watchdog():
+                            last_feed = current_time
+                            self.feed_block_reason = None
+                            logger.debug("Watchdog gefüttert (nächstes Feed in %ss)",
+                                         self.heartbeat_interval)
+                        else:
+                            self.feed_block_reason = "feed_error"
+                            logger.error("Watchdog-Feed fehlgeschlagen!")
                 
-                time.sleep(1)  # 1 Sekunde Heartbeat
+                self.clock.sleep(1)
                 
             except Exception as e:
-                logger.error(f"Heartbeat-Thread Fehler: {e}")
-                time.sleep(1)
+                logger.error("Feed-Thread Fehler: %s", e)
+                self.clock.sleep(1)
     
     def switch_monitor_thread(self):
         """Schalter-Monitor für manuellen Reset"""
         logger.info("Schalter-Monitor gestartet")
-        logger.info(f"Reset-Schalter {self.reset_hold_time}s halten für sofortigen Reset")
+        logger.info("Reset-Schalter %ss halten für sofortigen Reset", self.reset_hold_time)
         
         while self.running:
             try:
+                # Ein Snapshot für alle Eingänge, Events an die Abonnenten
+                self.inputs.poll()
                 current_switch_state = self.read_switch()
-                current_time = time.time()
+                current_time = self.clock.monotonic()  # Haltezeit unabhängig von NTP
                 
                 # Schalter-Zustandsänderung
                 if current_switch_state != self.last_switch_state:
                     if current_switch_state:  # Schalter geschlossen
                         logger.warning("RESET-SCHALTER GEDRÜCKT!")
-                        logger.warning(f"Halte {self.reset_hold_time}s für sofortigen TCO Reset...")
+                        logger.warning("Halte %ss für sofortigen TCO Reset...", self.reset_hold_time)
                         self.switch_press_start = current_time
                         
                         # Status-LED schnell blinken (Warnung)
                         for i in range(10):
                             self.set_pin(self.STATUS_LED_PORT, self.STATUS_LED_PIN, i % 2)
-                            time.sleep(0.1)
+                            self.clock.sleep(0.1)
                         
                     else:  # Schalter geöffnet
                         if self.switch_press_start:
                             hold_duration = current_time - self.switch_press_start
-                            logger.info(f"Reset-Schalter losgelassen nach {hold_duration:.1f}s")
+                            logger.info("Reset-Schalter losgelassen nach %.1fs", hold_duration)
                             
                             if hold_duration < self.reset_hold_time:
                                 logger.info("Reset abgebrochen (zu kurz gehalten)")
@@ -294,7 +681,7 @@ class IntelTCOWatchdog:
                     self.switch_press_start and 
                     current_time - self.switch_press_start >= self.reset_hold_time):
                     
-                    logger.critical(f"RESET-SCHALTER {self.reset_hold_time}s GEHALTEN!")
+                    logger.critical("RESET-SCHALTER %ss GEHALTEN!", self.reset_hold_time)
                     logger.critical("LÖSE SOFORTIGEN TCO WATCHDOG RESET AUS!")
                     
                     # Sofortigen Reset auslösen
@@ -303,11 +690,59 @@ class IntelTCOWatchdog:
                     # Nach Reset sollten wir hier nicht mehr ankommen
                     break
                 
-                time.sleep(0.1)  # 100ms Polling
+                self.clock.sleep(0.1)  # 100ms Polling
                 
             except Exception as e:
-                logger.error(f"Schalter-Monitor Fehler: {e}")
-                time.sleep(1)
+                logger.error("Schalter-Monitor Fehler: %s", e)
+                self.clock.sleep(1)
+    
+    def kernel_log_thread(self):
+        """Kernel-Meldungen zu Watchdog und I2C ins eigene Log übernehmen"""
+        reader = KmsgReader()
+        try:
+            for record in reader.records(follow=True, running=lambda: self.running):
+                self.handle_kernel_record(record)
+        except Exception as e:
+            logger.warning("Kernel-Log (%s) nicht lesbar: %s", reader.path, e)
+        finally:
+            reader.close()
+    
+    def handle_kernel_record(self, record):
+        """Kernel-Meldung zählen und mit passendem Level loggen (nur Meldungen seit Start)"""
+        if record.timestamp < self.kmsg_since:
+            self.kernel_events['before_start'] += 1
+            return
+        
+        # Hardware-Pretimeout: zuerst sichern, dann loggen
+        if self.hw_pretimeout and tco_pretimeout.is_pretimeout_event(record.message, self.watchdog_name):
+            self.emergency_flush('hardware')
+        
+        text = record.message.lower()
+        category = 'i2c' if 'i2c' in text or 'designware' in text else 'watchdog'
+        self.kernel_events[category] += 1
+        
+        if record.level <= 3:         # KERN_ERR und schlimmer
+            self.kernel_events['errors'] += 1
+            level = logging.ERROR
+        elif record.level == 4:       # KERN_WARNING
+            self.kernel_events['warnings'] += 1
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        logger.log(level, "Kernel [%.3f]: %s", record.timestamp, record.message,
+                   extra={'EVENT': f'kernel_{category}', 'KERNEL_SEQ': record.seq})
+    
+    def report_kernel_events(self):
+        """Zähler der Kernel-Meldungen loggen, wenn sich seit dem letzten Bericht etwas geändert hat"""
+        events = dict(self.kernel_events)
+        if events == self.kernel_events_reported:
+            return
+        self.kernel_events_reported = events
+        logger.info("Kernel-Meldungen seit Start: %s Watchdog, %s I2C, %s Fehler, %s Warnungen "
+                    "(%s ältere übersprungen)", events['watchdog'], events['i2c'],
+                    events['errors'], events['warnings'], events['before_start'],
+                    extra={'EVENT': 'kernel_stats', 'KERNEL_ERRORS': events['errors'],
+                           'KERNEL_WARNINGS': events['warnings']})
     
     def get_watchdog_info(self):
         """Watchdog-Informationen anzeigen"""
@@ -337,10 +772,14 @@ class IntelTCOWatchdog:
             except:
                 pass
             
+            # I2C-Worker
+            info['i2c'] = (f"I2C-Bus: {self.i2c_health} ({self.i2c.errors} Fehler, "
+                           f"{self.i2c.dropped} verworfen)")
+            
             return info
             
         except Exception as e:
-            logger.error(f"Watchdog-Info Fehler: {e}")
+            logger.error("Watchdog-Info Fehler: %s", e)
             return {}
     
     def cleanup(self):
@@ -355,13 +794,15 @@ class IntelTCOWatchdog:
             self.set_pin(self.STATUS_LED_PORT, self.STATUS_LED_PIN, False)
             self.set_pin(self.HEARTBEAT_PORT, self.HEARTBEAT_PIN, False)
             
-            # PCA9555 Bus schließen
-            self.bus.close()
+            # I2C-Worker beenden (arbeitet vorher die LED-Befehle ab)
+            self.i2c.close()
+            self.heartbeats.close()
+            self.dump.close()
             
             logger.info("TCO Watchdog Cleanup abgeschlossen")
             
         except Exception as e:
-            logger.error(f"Cleanup Fehler: {e}")
+            logger.error("Cleanup Fehler: %s", e)
     
     def signal_handler(self, sig, frame):
         """Signal Handler für sauberes Beenden"""
@@ -369,6 +810,23 @@ class IntelTCOWatchdog:
         self.cleanup()
         sys.exit(0)
     
+    def start_threads(self):
+        """Feed-, Heartbeat- und Schalter-Thread über die Clock starten"""
+        if self.realtime['enabled']:
+            # Vor dem Thread-Start, damit auch der Stack des Feed-Threads gesperrt ist
+            try:
+                tco_realtime.lock_memory(self.realtime['prefault_kb'])
+                logger.info("Speicher gesperrt (mlockall), %s KB vorab eingelagert",
+                            self.realtime['prefault_kb'])
+            except Exception as e:
+                logger.error("mlockall fehlgeschlagen: %s", e)
+        
+        return [
+            self.clock.start_thread(self.feed_thread, name="feed"),
+            self.clock.start_thread(self.heartbeat_thread, name="heartbeat"),
+            self.clock.start_thread(self.switch_monitor_thread, name="switch-monitor"),
+        ]
+    
     def run(self):
         """Hauptfunktion"""
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -379,38 +837,47 @@ class IntelTCOWatchdog:
         # Watchdog-Informationen anzeigen
         info = self.get_watchdog_info()
         for key, value in info.items():
-            logger.info(f"{key}: {value}")
+            logger.info("%s: %s", key, value)
         
-        logger.info(f"Watchdog-Timeout: {self.timeout}s")
-        logger.info(f"Feed-Intervall: {self.heartbeat_interval}s")
+        logger.info("Watchdog-Timeout: %ss", self.timeout)
+        logger.info("Feed-Intervall: %ss", self.heartbeat_interval)
+        logger.info("Echtzeit-Modus: %s", "aktiv" if self.realtime['enabled'] else "aus")
         logger.info("Heartbeat-LED sollte blinken")
         logger.info("Status-LED sollte leuchten")
-        logger.info(f"Reset-Schalter {self.reset_hold_time}s halten für sofortigen Reset")
+        logger.info("Reset-Schalter %ss halten für sofortigen Reset", self.reset_hold_time)
+        if self.input_hooks:
+            logger.info("%s Input-Hooks aus %s aktiv", len(self.input_hooks), self.config_file)
         
         try:
             # Threads starten
-            heartbeat_thread = threading.Thread(target=self.heartbeat_thread)
-            heartbeat_thread.daemon = True
-            heartbeat_thread.start()
+            self.start_threads()
             
-            switch_thread = threading.Thread(target=self.switch_monitor_thread)
-            switch_thread.daemon = True
-            switch_thread.start()
+            # Kernel-Log blockiert in poll() auf /dev/kmsg, nicht auf der Clock
+            threading.Thread(target=self.kernel_log_thread, name="kernel-log", daemon=True).start()
             
             logger.info("Intel TCO Watchdog aktiv")
             logger.info("System wird überwacht...")
             
             # Haupt-Loop
+            last_report = self.clock.monotonic()
             while self.running:
-                time.sleep(5)
+                self.clock.sleep(5)
+                
+                # Zusammenfassung unterdrückter Meldungen, auch wenn die Serie aufgehört hat
+                tco_journal.flush(logger)
+                
+                # Kernel-Meldungen höchstens einmal pro Minute zusammenfassen
+                if self.clock.monotonic() - last_report >= 60:
+                    self.report_kernel_events()
+                    last_report = self.clock.monotonic()
                 
                 # Watchdog-Status prüfen
-                time_since_feed = time.time() - self.last_feed
+                time_since_feed = self.clock.monotonic() - self.last_feed_monotonic
                 if time_since_feed > self.heartbeat_interval * 2:
-                    logger.warning(f"Watchdog nicht gefüttert seit {time_since_feed:.1f}s!")
+                    logger.warning("Watchdog nicht gefüttert seit %.1fs!", time_since_feed)
                 
         except Exception as e:
-            logger.error(f"Hauptschleife Fehler: {e}")
+            logger.error("Hauptschleife Fehler: %s", e)
         finally:
             self.cleanup()
 
@@ -439,18 +906,48 @@ def main():
             
             # Kernel-Logs
             try:
-                result = subprocess.run(['dmesg', '|', 'grep', '-i', 'tco'], 
-                                      shell=True, capture_output=True, text=True)
-                if result.stdout:
-                    print("\nKernel-Logs (TCO):")
-                    for line in result.stdout.split('\n')[-5:]:
-                        if line.strip():
-                            print(f"  {line}")
+                reader = KmsgReader()
+                records = list(reader.records())[-5:]
+                reader.close()
+                if records:
+                    print("\nKernel-Logs (TCO/Watchdog/I2C):")
+                    for record in records:
+                        print(f"  [{record.timestamp:12.6f}] {record.message}")
             except:
                 pass
             
             return
         
+        elif sys.argv[1] == "kmsg":
+            # Kernel-Meldungen live verfolgen (Regex optional)
+            reader = KmsgReader(pattern=sys.argv[2]) if len(sys.argv) > 2 else KmsgReader()
+            try:
+                for record in reader.records(follow=True):
+                    print(f"[{record.timestamp:12.6f}] <{record.level}> {record.message}", flush=True)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                reader.close()
+            return
+        
+        elif sys.argv[1] == "soak":
+            # Beschleunigter Soak-Test in virtueller Zeit
+            import tco_soak
+            days = float(sys.argv[2]) if len(sys.argv) > 2 else 7.0
+            sys.exit(0 if tco_soak.run_soak(IntelTCOWatchdog, days) else 1)
+        
+        elif sys.argv[1] == "pretimeout-test":
+            # Notfall-Abbild mit simuliertem oder echtem Device (softdog) auslösen
+            import tco_soak
+            device = sys.argv[2] if len(sys.argv) > 2 else None
+            sys.exit(0 if tco_soak.run_pretimeout_test(IntelTCOWatchdog, device) else 1)
+        
+        elif sys.argv[1] == "bench":
+            # Feed-Latenz unter Last mit und ohne Echtzeit-Modus
+            seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+            tco_realtime.run_benchmark(seconds)
+            return
+        
         elif sys.argv[1] == "reset":
             # Sofortiger Reset
             print("SOFORTIGER TCO WATCHDOG RESET!")
@@ -461,6 +958,9 @@ def main():
             return
     
     try:
+        # Natives Journal (unter systemd) und Rate-Limiting pro Ereignistyp
+        tco_journal.setup(logger, "tco-watchdog", rate=0.1, burst=5)
+        
         controller = IntelTCOWatchdog()
         controller.run()
         
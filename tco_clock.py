@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Zeitquellen für den TCO Watchdog
+SystemClock liefert echte Zeit; VirtualClock lässt Soak-Tests Tage in Minuten
+durchlaufen. Alle Zeitabhängigkeiten (sleep, Events mit Timeout, Threads) des
+Controllers und des I2C-Workers laufen über eine dieser Uhren.
+"""
+
+import time
+import heapq
+import threading
+
+
+class SystemClock:
+    """
+    Echte Zeit - alle Zeitabhängigkeiten des Controllers laufen hierüber
+    """
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def event(self):
+        return threading.Event()
+
+    def start_thread(self, target, name=None):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+
+class VirtualEvent:
+    """
+    Event in virtueller Zeit - wait() zählt als Schlafen, der Timeout in virtuellen Sekunden
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.flag = False
+        self.entry = None             # Eigener Eintrag im Heap bzw. ohne Timeout
+
+    def set(self):
+        clock = self.clock
+        with clock.lock:
+            self.flag = True
+            entry, self.entry = self.entry, None
+            if entry is None:
+                return
+            if entry[0] is None:
+                clock.blocked -= 1
+            else:
+                clock.waiting.remove(entry)
+                heapq.heapify(clock.waiting)
+            entry[2].release()
+
+    def wait(self, timeout=None):
+        clock = self.clock
+        wakeup = threading.Lock()
+        wakeup.acquire()
+        with clock.lock:
+            if self.flag:
+                return True
+            if timeout is None:
+                self.entry = [None, 0, wakeup, self]
+                clock.blocked += 1
+            else:
+                clock.seq += 1
+                self.entry = [clock.now + max(timeout, 0), clock.seq, wakeup, self]
+                heapq.heappush(clock.waiting, self.entry)
+            clock._advance()
+        wakeup.acquire()
+        return self.flag
+
+
+class VirtualClock:
+    """
+    Virtuelle Zeit für beschleunigte Soak-Tests
+    Schlafen alle beteiligten Threads, wird direkt zum nächsten Weckzeitpunkt gesprungen.
+    Jeder Thread, der sleep() oder event() benutzt, muss Teilnehmer sein.
+    """
+
+    def __init__(self, epoch=1_000_000_000.0):
+        self.epoch = epoch
+        self.now = 0.0
+        self.lock = threading.Lock()
+        self.participants = 0
+        self.waiting = []             # Heap aus [Weckzeit, Seq, Weck-Lock, Event]
+        self.blocked = 0              # Wartende ohne Timeout (Event.wait())
+        self.seq = 0
+
+    def time(self):
+        return self.epoch + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def register(self):
+        """Aufrufenden Thread als Teilnehmer anmelden"""
+        with self.lock:
+            self.participants += 1
+
+    def unregister(self):
+        """Teilnehmer abmelden (z.B. Thread beendet)"""
+        with self.lock:
+            self.participants -= 1
+            self._advance()
+
+    def start_thread(self, target, name=None):
+        def runner():
+            try:
+                target()
+            finally:
+                self.unregister()
+
+        self.register()
+        thread = threading.Thread(target=runner, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def event(self):
+        return VirtualEvent(self)
+
+    def sleep(self, seconds):
+        wakeup = threading.Lock()
+        wakeup.acquire()
+        with self.lock:
+            self.seq += 1
+            heapq.heappush(self.waiting, [self.now + max(seconds, 0), self.seq, wakeup, None])
+            self._advance()
+        # Ist der eigene Wecker der nächste, ist das Lock schon frei
+        wakeup.acquire()
+
+    def _advance(self):
+        # Nur vorspulen, wenn kein Teilnehmer mehr aktiv rechnet
+        if self.waiting and len(self.waiting) + self.blocked >= self.participants:
+            wake, _, wakeup, event = heapq.heappop(self.waiting)
+            if event is not None:
+                event.entry = None    # Timeout abgelaufen
+            self.now = max(self.now, wake)
+            wakeup.release()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Liveness-Heartbeat für Anwendungen über Shared Memory
+Die Anwendung zählt einen Zähler in einer mmap-Datei hoch (ohne Syscall),
+der TCO Watchdog prüft vor jedem Feed, ob alle Zähler weiterlaufen.
+
+Anwendung:
+    from tco_heartbeat import Heartbeat
+    hb = Heartbeat("meine-app", timeout=5.0)
+    while True:
+        ...
+        hb.beat()
+"""
+
+import os
+import grp
+import mmap
+import stat
+import time
+import struct
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_DIR = "/run/tco-watchdog/heartbeat"
+HEARTBEAT_GROUP = "tco-heartbeat"     # Mitglieder dürfen Heartbeats anlegen
+
+# Segment-Layout (alle Felder 8-Byte-ausgerichtet):
+#   0: Magic 'TCOH'   4: PID (uint32)   8: Zähler (uint64)
+#  16: Zeitstempel CLOCK_MONOTONIC (double)   24: Timeout in s (double)
+MAGIC = b'TCOH'
+HEADER = struct.Struct('<4sIQdd')
+SEGMENT_SIZE = HEADER.size
+COUNTER = struct.Struct('<Q')
+
+
+class Heartbeat:
+    """
+    Client-Seite: ein Segment pro Anwendung
+    beat() schreibt nur in gemapten Speicher - kein Syscall im Hot-Path
+    """
+
+    def __init__(self, name, timeout=5.0, directory=HEARTBEAT_DIR):
+        if not name or '/' in name:
+            raise ValueError(f"Ungültiger Heartbeat-Name: {name!r}")
+
+        self.path = os.path.join(directory, name)
+        os.makedirs(directory, exist_ok=True)
+
+        # Erst vollständig unter temporärem Namen anlegen, dann atomar
+        # umbenennen - der Watchdog sieht nie ein halb geschriebenes Segment
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, SEGMENT_SIZE)
+            self.mm = mmap.mmap(fd, SEGMENT_SIZE)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self.mm, 0, MAGIC, os.getpid(), 0, time.monotonic(), float(timeout))
+        os.rename(tmp_path, self.path)
+
+        # Direkte Sichten auf Zähler und Zeitstempel
+        view = memoryview(self.mm)
+        self._counter = view[8:16].cast('Q')
+        self._stamp = view[16:24].cast('d')
+        self.timeout = timeout
+
+    def beat(self):
+        """Lebenszeichen geben (Zähler erhöhen, Zeitstempel setzen)"""
+        self._counter[0] = (self._counter[0] + 1) & 0xFFFFFFFFFFFFFFFF
+        self._stamp[0] = time.monotonic()  # vDSO, kein Kernel-Eintritt
+
+    def close(self):
+        """Abmelden - der Watchdog überwacht diesen Client nicht mehr"""
+        if self.mm is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._counter.release()
+        self._stamp.release()
+        self.mm.close()
+        self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HeartbeatMonitor:
+    """
+    Watchdog-Seite: überwacht alle registrierten Segmente
+    Ein Client gilt als hängend, wenn sein Zähler länger als sein Timeout steht.
+    Segmente gehören den Clients - sie werden nie gemappt, nur per pread gelesen
+    (eine gekürzte Datei darf den Daemon nicht per SIGBUS beenden).
+    scan() gehört in einen unkritischen Thread, check() in den Feed-Pfad.
+    """
+
+    def __init__(self, directory=HEARTBEAT_DIR, group=HEARTBEAT_GROUP):
+        self.directory = directory
+        self.group = group
+        self.clients = {}  # Name -> dict(fd, ino, counter, changed, timeout, pid, stale)
+        self.invalid = set()  # Bereits gemeldete ungültige Einträge (Name, Inode)
+        self.lock = threading.Lock()  # Nur um Änderungen an clients (fd-Wiederverwendung)
+
+    def setup(self):
+        """Verzeichnis anlegen - beschreibbar nur für die Heartbeat-Gruppe (Sticky-Bit)"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                gid = grp.getgrnam(self.group).gr_gid
+                os.chown(self.directory, 0, gid)
+                os.chmod(self.directory, 0o1770)
+            except KeyError:
+                logger.warning("Gruppe %s fehlt - Heartbeats nur für root", self.group)
+                os.chmod(self.directory, 0o755)
+        except Exception as e:
+            logger.warning("Heartbeat-Verzeichnis %s nicht verfügbar: %s", self.directory, e)
+
+    def _open_segment(self, name):
+        """Segment prüfen und öffnen - nur reguläre Dateien voller Größe, keine Symlinks/FIFOs"""
+        fd = os.open(os.path.join(self.directory, name),
+                     os.O_RDONLY | os.O_NONBLOCK | os.O_NOFOLLOW)
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                raise ValueError("keine reguläre Datei")
+            if st.st_size < SEGMENT_SIZE:
+                raise ValueError(f"zu klein ({st.st_size} Bytes)")
+            header = os.pread(fd, SEGMENT_SIZE, 0)
+            if len(header) < SEGMENT_SIZE:
+                raise ValueError("unvollständig")
+            magic, pid, counter, _, timeout = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("falsches Magic")
+        except Exception:
+            os.close(fd)
+            raise
+        return fd, pid, counter, timeout
+
+    def _remove(self, name):
+        with self.lock:
+            client = self.clients.pop(name)
+            os.close(client['fd'])
+
+    def scan(self, now=None):
+        """Neue Clients aufnehmen, abgemeldete entfernen (nicht im Feed-Pfad aufrufen)"""
+        if now is None:
+            now = time.monotonic()
+        try:
+            with os.scandir(self.directory) as entries:
+                found = {e.name: e.inode() for e in entries if not e.name.endswith('.tmp')}
+        except FileNotFoundError:
+            found = {}
+        self.invalid &= set(found.items())
+
+        # Abgemeldet oder neu angelegt (Client-Neustart = neue Datei unter gleichem Namen)
+        for name in list(self.clients):
+            if found.get(name) != self.clients[name]['ino']:
+                if name not in found:
+                    logger.info("Heartbeat-Client abgemeldet: %s", name)
+                self._remove(name)
+
+        for name, ino in found.items():
+            if name in self.clients or (name, ino) in self.invalid:
+                continue
+            try:
+                fd, pid, counter, timeout = self._open_segment(name)
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning("Heartbeat-Segment %s ungültig: %s", name, e)
+                self.invalid.add((name, ino))
+                continue
+
+            # Gnadenfrist ab Entdeckung
+            with self.lock:
+                self.clients[name] = {'fd': fd, 'ino': ino, 'counter': counter, 'changed': now,
+                                      'timeout': timeout, 'pid': pid, 'stale': False}
+            logger.info("Heartbeat-Client registriert: %s (PID %s, Timeout %gs)", name, pid, timeout)
+
+    def check(self, now=None):
+        """
+        Zähler vergleichen und Namen der hängenden Clients liefern
+        Nur ein pread pro Client - neue Clients nimmt erst scan() auf
+        """
+        if now is None:
+            now = time.monotonic()
+
+        stale = []
+        with self.lock:
+            counters = []
+            for name, client in self.clients.items():
+                try:
+                    counter, = COUNTER.unpack(os.pread(client['fd'], 8, 8))
+                except (OSError, struct.error):
+                    # Gekürzt oder kaputt: wie ein stehender Zähler behandeln
+                    counter = client['counter']
+                counters.append((name, client, counter))
+
+        for name, client, counter in counters:
+            if counter != client['counter']:
+                client['counter'] = counter
+                client['changed'] = now
+                if client['stale']:
+                    logger.info("Heartbeat-Client %s lebt wieder", name)
+                client['stale'] = False
+            elif now - client['changed'] > client['timeout']:
+                if not client['stale']:
+                    logger.error("Heartbeat-Client %s hängt seit %.1fs (Timeout %gs)",
+                                 name, now - client['changed'], client['timeout'])
+                client['stale'] = True
+                stale.append(name)
+        return stale
+
+    def close(self):
+        for name in list(self.clients):
+            self._remove(name)
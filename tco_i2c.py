@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+I2C-Worker für den PCA9555
+Alle Expander-Zugriffe laufen in einem eigenen Prozess mit begrenzter
+Befehls-Queue. python3-smbus gibt den GIL während eines ioctl nicht frei -
+ein hängender DesignWare-Controller würde sonst jeden Thread des Daemons
+(auch den Feed) anhalten. Aufrufer posten nur und warten höchstens bis zur
+Deadline ihres Befehls.
+"""
+
+import os
+import time
+import queue
+import errno
+import logging
+import threading
+import itertools
+import collections
+import multiprocessing
+from types import SimpleNamespace
+
+from tco_clock import SystemClock
+
+logger = logging.getLogger(__name__)
+
+# Gesundheitszustände des Busses
+HEALTH_OK = "ok"              # Letzte Transaktion erfolgreich
+HEALTH_ERROR = "error"        # Transaktionen schlagen fehl (Bus antwortet aber)
+HEALTH_STUCK = "stuck"        # Eine Transaktion hängt länger als stuck_timeout
+HEALTH_DOWN = "down"          # Worker läuft nicht
+
+
+class _EventQueue:
+    """
+    Befehls-Queue für den Thread-Modus
+    get() wartet über ein Event der Clock - in virtueller Zeit zählt der Worker als schlafend
+    """
+
+    def __init__(self, make_event):
+        self.items = collections.deque()
+        self.make_event = make_event
+        self.waiter = None
+        self.lock = threading.Lock()
+
+    def qsize(self):
+        return len(self.items)
+
+    def put_nowait(self, item):
+        with self.lock:
+            self.items.append(item)
+            waiter, self.waiter = self.waiter, None
+        if waiter is not None:
+            waiter.set()
+
+    def put(self, item, timeout=None):
+        self.put_nowait(item)
+
+    def get(self):
+        while True:
+            with self.lock:
+                if self.items:
+                    return self.items.popleft()
+                waiter = self.waiter = self.make_event()
+            waiter.wait()
+
+
+def _execute(bus, address, op, args):
+    """Eine Operation auf dem Bus ausführen"""
+    if op == 'read_word_data':
+        return bus.read_word_data(address, args[0])
+    if op == 'read_byte_data':
+        return bus.read_byte_data(address, args[0])
+    if op == 'write_byte_data':
+        bus.write_byte_data(address, args[0], args[1])
+        return None
+    if op == 'update_bits':
+        # Read-Modify-Write als eine Einheit, Schreiben nur bei Änderung
+        reg, mask, bits = args
+        value = bus.read_byte_data(address, reg)
+        new = (value & ~mask & 0xFF) | (bits & mask)
+        if new != value:
+            bus.write_byte_data(address, reg, new)
+        return new
+    raise ValueError(f"Unbekannte I2C-Operation: {op}")
+
+
+def _worker_loop(bus, address, get, put, busy, monotonic=time.monotonic):
+    """Befehle abarbeiten bis None kommt; busy.value = Startzeit der laufenden Transaktion"""
+    while True:
+        cmd = get()
+        if cmd is None:
+            break
+        req_id, op, args, deadline = cmd
+
+        # Abgelaufene Befehle (z.B. LED-Blinken hinter einem Stau) verwerfen
+        if monotonic() > deadline:
+            put((req_id, 'expired', None))
+            continue
+
+        busy.value = monotonic()
+        try:
+            put((req_id, 'ok', _execute(bus, address, op, args)))
+        except Exception as e:
+            put((req_id, 'error', getattr(e, 'errno', None) or errno.EIO))
+        finally:
+            busy.value = 0.0
+
+
+def _process_main(bus_num, address, cmd_queue, result_queue, busy):
+    """Einstiegspunkt des Worker-Prozesses - meldet sich mit Request-ID 0 bereit"""
+    try:
+        import smbus
+        bus = smbus.SMBus(bus_num)
+    except Exception as e:
+        result_queue.put((0, 'error', getattr(e, 'errno', None) or errno.EIO))
+        return
+    result_queue.put((0, 'ready', None))
+    try:
+        _worker_loop(bus, address, cmd_queue.get, result_queue.put, busy)
+    finally:
+        bus.close()
+
+
+class I2CWorker:
+    """
+    Expander-I/O über einen Worker mit begrenzter Queue
+    submit() blockiert nie, call() höchstens bis zur Deadline.
+    Mit bus=<Objekt> läuft der Worker als Thread über clock (Simulation: Worker und
+    Deadlines laufen dann in virtueller Zeit), sonst als Prozess mit Deadlines in Echtzeit.
+    Gewartet wird in beiden Fällen über Events der clock.
+    """
+
+    def __init__(self, address, bus_num=None, bus=None, queue_size=32,
+                 deadline=0.5, stuck_timeout=2.0, restart_after=30.0, clock=None):
+        self.address = address
+        self.bus_num = bus_num
+        self.bus = bus
+        self.queue_size = queue_size
+        self.deadline = deadline            # Standard-Deadline pro Transaktion
+        self.stuck_timeout = stuck_timeout
+        self.restart_after = restart_after
+        self.clock = clock or SystemClock()
+        # Der Prozess prüft Deadlines mit seiner eigenen (echten) Uhr
+        self.monotonic = self.clock.monotonic if bus is not None else time.monotonic
+
+        self.ids = itertools.count(1)       # 0 = Start-Handshake des Prozesses
+        self.pending = {}                   # Request-ID -> [Weck-Event, Status, Wert]
+        self.lock = threading.Lock()
+        self.health = HEALTH_DOWN
+        self.dropped = 0                    # Wegen voller Queue verworfen
+        self.errors = 0
+        self.last_errno = None
+        self.worker = None
+        self.started = 0.0
+        self.ready = None                   # Gesetzt, sobald der Worker Befehle annimmt
+
+    def start(self):
+        if self.bus is not None:
+            # Die Grenze der Queue prüft _post() selbst
+            self.cmd_queue = _EventQueue(self.clock.event)
+            self.busy = SimpleNamespace(value=0.0)
+            run = lambda: _worker_loop(self.bus, self.address, self.cmd_queue.get,
+                                       self._resolve_tuple, self.busy, self.monotonic)
+            self.worker = self.clock.start_thread(run, name="i2c-worker")
+            self.ready = self.clock.event()
+            self.ready.set()
+        else:
+            # spawn: sauberer Prozess, unabhängig von Threads/Locks des Daemons
+            ctx = multiprocessing.get_context('spawn')
+            self.ready = self.clock.event()  # Bleibt gesetzt - wait_ready() danach ohne Warten
+            self.cmd_queue = ctx.Queue(self.queue_size)
+            self.result_queue = ctx.Queue()
+            self.busy = ctx.Value('d', 0.0, lock=False)
+            self.worker = ctx.Process(
+                target=_process_main, name="i2c-worker", daemon=True,
+                args=(self.bus_num, self.address, self.cmd_queue, self.result_queue, self.busy))
+            self.worker.start()
+            threading.Thread(target=self._collect, args=(self.result_queue,),
+                             name="i2c-results", daemon=True).start()
+        self.started = self.monotonic()
+        self.health = HEALTH_OK
+
+    def _collect(self, result_queue):
+        """Ergebnisse des Worker-Prozesses zuordnen"""
+        while True:
+            try:
+                result = result_queue.get()
+            except Exception:             # Queue geschlossen (Neustart/Beenden)
+                return
+            if result is None:
+                return
+            if result[0] == 0:
+                self._handshake(result)
+            else:
+                self._resolve_tuple(result)
+
+    def _handshake(self, result):
+        _, status, value = result
+        if status != 'ready':
+            logger.error("I2C-Worker konnte i2c-%s nicht öffnen: %s", self.bus_num, os.strerror(value))
+            self.last_errno = value
+            self.health = HEALTH_DOWN
+        self.ready.set()
+
+    def wait_ready(self, timeout=10.0):
+        """
+        Auf den Start-Handshake warten (spawn importiert Hauptmodul und smbus neu -
+        auf einem langsamen Atom dauert das länger als eine Befehls-Deadline)
+        """
+        ready = self.ready
+        return ready is not None and ready.wait(timeout) and self.health != HEALTH_DOWN
+
+    def _resolve_tuple(self, result):
+        req_id, status, value = result
+        if status == 'error':
+            self.errors += 1
+            self.last_errno = value
+            if self.health == HEALTH_OK:
+                self.health = HEALTH_ERROR
+        elif status == 'ok' and self.health == HEALTH_ERROR:
+            self.health = HEALTH_OK
+
+        with self.lock:
+            slot = self.pending.pop(req_id, None)
+        if slot is not None:
+            slot[1], slot[2] = status, value
+            slot[0].set()
+
+    def _post(self, op, args, timeout, slot=None):
+        """Befehl einreihen (nie blockierend) - liefert die Request-ID oder None"""
+        req_id = next(self.ids)
+        if slot is not None:
+            with self.lock:
+                self.pending[req_id] = slot
+        try:
+            if self.bus is not None and self.cmd_queue.qsize() >= self.queue_size:
+                raise queue.Full
+            self.cmd_queue.put_nowait((req_id, op, args, self.monotonic() + timeout))
+        except queue.Full:
+            self.dropped += 1
+            with self.lock:
+                self.pending.pop(req_id, None)
+            return None
+        return req_id
+
+    def submit(self, op, *args, timeout=None):
+        """Befehl einreihen ohne zu warten - False wenn die Queue voll ist"""
+        return self._post(op, args, timeout or self.deadline) is not None
+
+    def call(self, op, *args, timeout=None):
+        """
+        Befehl ausführen und bis zur Deadline auf das Ergebnis warten
+        Wirft TimeoutError (Queue voll, Deadline überschritten) oder OSError
+        """
+        timeout = timeout or self.deadline
+        wakeup = self.clock.event()
+        slot = [wakeup, None, None]
+        req_id = self._post(op, args, timeout, slot)
+        if req_id is None:
+            raise TimeoutError(errno.EBUSY, "I2C-Queue voll")
+        if not wakeup.wait(timeout):
+            with self.lock:
+                self.pending.pop(req_id, None)
+            raise TimeoutError(errno.ETIMEDOUT, f"I2C {op} nach {timeout:g}s ohne Antwort")
+        status, value = slot[1], slot[2]
+        if status == 'expired':
+            raise TimeoutError(errno.ETIMEDOUT, f"I2C {op} abgelaufen")
+        if status == 'error':
+            raise OSError(value, os.strerror(value))
+        return value
+
+    def check_health(self):
+        """
+        Watchdog für den Worker - periodisch aus einem unkritischen Thread aufrufen
+        Liefert den aktuellen Zustand; hängt der Bus zu lange, wird der Worker neu gestartet
+        """
+        if self.worker is None:
+            return HEALTH_DOWN
+
+        busy_since = self.busy.value
+        hung = self.monotonic() - busy_since if busy_since else 0.0
+
+        if not self.worker.is_alive():
+            self.health = HEALTH_DOWN
+        elif hung > self.stuck_timeout:
+            self.health = HEALTH_STUCK
+        elif self.health in (HEALTH_STUCK, HEALTH_DOWN):
+            self.health = HEALTH_OK
+
+        # Prozess-Worker kann neu gestartet werden, ein Thread nicht
+        # (höchstens alle restart_after Sekunden)
+        if self.bus is None and self.health in (HEALTH_DOWN, HEALTH_STUCK) \
+                and self.monotonic() - self.started > self.restart_after \
+                and (self.health == HEALTH_DOWN or hung > self.restart_after):
+            self.restart()
+        return self.health
+
+    def restart(self):
+        """Hängenden oder beendeten Worker-Prozess ersetzen"""
+        logger.warning("I2C-Worker wird neu gestartet")
+        try:
+            self.worker.kill()
+            self.worker.join(1.0)
+            self.result_queue.put(None)  # Alten Collector beenden
+        except Exception:
+            pass
+        with self.lock:
+            stale = list(self.pending.values())
+            self.pending.clear()
+        for slot in stale:
+            slot[1], slot[2] = 'error', errno.EIO
+            slot[0].set()
+        self.start()
+
+    def close(self):
+        if self.worker is None:
+            return
+        try:
+            self.cmd_queue.put(None, timeout=self.deadline)
+            self.worker.join(self.deadline)
+            if self.bus is None:
+                if self.worker.is_alive():
+                    self.worker.kill()
+                self.result_queue.put(None)
+        except Exception:
+            pass
+        self.worker = None
+        self.health = HEALTH_DOWN
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Eingänge des PCA9555 als Änderungs-Events
+Ein Snapshot beider Input-Ports pro Abtastung, Abonnenten pro Bitmaske.
+"""
+
+import logging
+from collections import namedtuple
+
+from tco_clock import SystemClock
+
+logger = logging.getLogger(__name__)
+
+# Ein Eingangs-Event pro geändertem Bit (bit = port * 8 + pin)
+InputEvent = namedtuple('InputEvent', ['bit', 'port', 'pin', 'value', 'timestamp', 'initial'])
+
+
+class InputEventBus:
+    """
+    Änderungs-Events für alle 16 Eingänge des PCA9555
+    Pro Abtastung ein Snapshot beider Input-Ports, Änderungserkennung per XOR
+    """
+
+    def __init__(self, read_snapshot, clock=None):
+        self.read_snapshot = read_snapshot  # Liefert 16-Bit-Wert oder None
+        self.clock = clock or SystemClock()
+        self.state = None
+        self.subscribers = []               # Liste von (Maske, Callback)
+
+    def subscribe(self, callback, mask=0xFFFF):
+        """Callback für alle Bits in mask registrieren"""
+        self.subscribers.append((mask, callback))
+        return callback
+
+    def unsubscribe(self, callback):
+        """Callback wieder entfernen"""
+        self.subscribers = [(m, cb) for m, cb in self.subscribers if cb is not callback]
+
+    def get(self, port, pin):
+        """Letzten bekannten Pegel eines Eingangs liefern (None = noch kein Snapshot)"""
+        if self.state is None:
+            return None
+        return bool(self.state & (1 << (port * 8 + pin)))
+
+    def poll(self):
+        """Snapshot lesen und Events für alle geänderten Bits verteilen"""
+        snapshot = self.read_snapshot()
+        if snapshot is None:
+            return 0
+
+        initial = self.state is None
+        changed = 0xFFFF if initial else (snapshot ^ self.state)
+        self.state = snapshot
+        if not changed:
+            return 0
+
+        now = self.clock.time()
+        for mask, callback in list(self.subscribers):
+            bits = changed & mask
+            while bits:
+                bit = (bits & -bits).bit_length() - 1
+                bits &= bits - 1
+                event = InputEvent(bit, bit // 8, bit % 8, bool(snapshot & (1 << bit)), now, initial)
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error("Input-Callback Fehler (Pin %s.%s): %s", event.port, event.pin, e)
+        return changed
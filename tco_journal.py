@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Native journald-Anbindung mit Rate-Limiting
+Sendet strukturierte Einträge direkt an /run/systemd/journal/socket,
+ohne dass journald Textzeilen von stdout neu parsen muss.
+
+Strukturierte Felder werden als extra übergeben (Namen in Großbuchstaben):
+    logger.info("Watchdog gefüttert", extra={'EVENT': 'feed', 'FEED_MARGIN_MS': 19800})
+"""
+
+import os
+import re
+import time
+import queue
+import atexit
+import socket
+import struct
+import threading
+import logging
+import logging.handlers
+
+JOURNAL_SOCKET = "/run/systemd/journal/socket"
+
+# Gültige journald-Feldnamen (kein führender Unterstrich = nicht vertrauenswürdig)
+FIELD_NAME = re.compile(r'^[A-Z0-9][A-Z0-9_]*$')
+
+# logging-Level -> syslog-Priorität
+PRIORITIES = {
+    logging.CRITICAL: 2,
+    logging.ERROR: 3,
+    logging.WARNING: 4,
+    logging.INFO: 6,
+    logging.DEBUG: 7,
+}
+
+
+class JournalHandler(logging.Handler):
+    """
+    logging-Handler für das native Journal-Protokoll (SOCK_DGRAM)
+    Der Socket ist nicht-blockierend: bei vollem Puffer wird verworfen und gezählt
+    """
+
+    def __init__(self, identifier, path=JOURNAL_SOCKET):
+        super().__init__()
+        self.identifier = identifier
+        self.path = path
+        self.dropped = 0
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    @staticmethod
+    def _field(name, value):
+        data = str(value).encode('utf-8', errors='replace')
+        if b'\n' in data:
+            # Binärformat: NAME\n<Länge als le64><Daten>\n
+            return name.encode() + b'\n' + struct.pack('<Q', len(data)) + data + b'\n'
+        return name.encode() + b'=' + data + b'\n'
+
+    def emit(self, record):
+        try:
+            message = record.getMessage()
+            if record.exc_info:
+                message += '\n' + logging.Formatter().formatException(record.exc_info)
+
+            fields = [
+                self._field('MESSAGE', message),
+                self._field('PRIORITY', PRIORITIES.get(record.levelno, 6)),
+                self._field('SYSLOG_IDENTIFIER', self.identifier),
+                self._field('CODE_FILE', record.pathname),
+                self._field('CODE_LINE', record.lineno),
+                self._field('CODE_FUNC', record.funcName),
+                self._field('THREAD_NAME', record.threadName),
+            ]
+            for name, value in record.__dict__.items():
+                if FIELD_NAME.match(name) and value is not None:
+                    fields.append(self._field(name, value))
+            if self.dropped:
+                fields.append(self._field('DROPPED', self.dropped))
+
+            self.sock.sendto(b''.join(fields), self.path)
+            self.dropped = 0
+
+        except (BlockingIOError, InterruptedError):
+            self.dropped += 1     # journald überlastet - Feed-Pfad nicht blockieren
+        except OSError:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.sock.close()
+        super().close()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token-Bucket pro Ereignistyp (EVENT-Feld, sonst Aufrufstelle)
+    Unterdrückte Meldungen werden beim nächsten durchgelassenen Eintrag gemeldet;
+    bleibt der aus (Fehlerserie vorbei), meldet flush() sie, sobald der Bucket wieder voll ist
+    """
+
+    def __init__(self, rate=1.0, burst=10, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate          # Tokens pro Sekunde
+        self.burst = burst
+        self.clock = clock
+        self.buckets = {}         # Schlüssel -> [Tokens, letzte Auffüllung, unterdrückt, Level]
+        self.lock = threading.Lock()
+
+    def _refill(self, bucket, now):
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+
+    def filter(self, record):
+        if getattr(record, 'SUPPRESSED_EVENT', None) is not None:
+            return True           # Eigene Zusammenfassung aus flush()
+        key = getattr(record, 'EVENT', None) or (record.pathname, record.lineno)
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(self.burst), now, 0, record.levelno]
+
+            self._refill(bucket, now)
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                bucket[3] = max(bucket[3], record.levelno)
+                return False
+
+            bucket[0] -= 1.0
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            # Zusammenfassung an diese Meldung hängen
+            record.SUPPRESSED = suppressed
+            record.args = (record.getMessage(), suppressed)
+            record.msg = "%s (%d gleiche Meldungen unterdrückt)"
+        return True
+
+    def flush(self, logger):
+        """Offene Zähler von Buckets melden, die sich wieder aufgefüllt haben (periodisch aufrufen)"""
+        now = self.clock()
+        pending = []
+        with self.lock:
+            for key, bucket in self.buckets.items():
+                if not bucket[2]:
+                    continue
+                self._refill(bucket, now)
+                if bucket[0] >= 1.0:
+                    bucket[0] -= 1.0
+                    pending.append((key, bucket[2], bucket[3]))
+                    bucket[2] = 0
+        for key, suppressed, level in pending:
+            event = key if isinstance(key, str) else f"{os.path.basename(key[0])}:{key[1]}"
+            logger.log(level, "%d Meldungen (%s) unterdrückt", suppressed, event,
+                       extra={'SUPPRESSED': suppressed, 'SUPPRESSED_EVENT': event})
+        return len(pending)
+
+
+def flush(logger):
+    """flush() aller RateLimitFilter an logger"""
+    for limiter in logger.filters:
+        if isinstance(limiter, RateLimitFilter):
+            limiter.flush(logger)
+
+
+def journal_available(path=JOURNAL_SOCKET):
+    """Unter systemd gestartet und Journal-Socket vorhanden"""
+    return bool(os.environ.get('JOURNAL_STREAM') or os.environ.get('INVOCATION_ID')) \
+        and os.path.exists(path)
+
+
+def setup(logger, identifier, rate=1.0, burst=10):
+    """
+    Root-Logger auf natives Journal umstellen (falls verfügbar) und
+    Rate-Limiting an logger hängen - greift nach der Level-Prüfung, vor jeder Ausgabe
+    Die Ausgabe selbst (Socket oder stdout) läuft in einem eigenen Listener-Thread:
+    aufrufende Threads, auch der SCHED_FIFO Feed-Thread, reihen nur ein.
+    Vor dem Start von Echtzeit-Threads aufrufen, damit der Listener normale Priorität erbt.
+    """
+    root = logging.getLogger()
+    handlers = [JournalHandler(identifier)] if journal_available() else list(root.handlers)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)    # Restliche Einträge beim Beenden ausgeben
+    root.addHandler(logging.handlers.QueueHandler(records))
+
+    limiter = RateLimitFilter(rate, burst)
+    logger.addFilter(limiter)
+    return limiter
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Streaming-Leser für Kernel-Meldungen aus /dev/kmsg
+Ein read() liefert genau einen Datensatz mit Level, Sequenznummer und
+Zeitstempel - ohne dmesg-Aufruf und ohne Textparsing der Ausgabe.
+"""
+
+import os
+import re
+import errno
+import select
+from collections import namedtuple
+
+# Ein Datensatz aus /dev/kmsg (timestamp in Sekunden seit Boot)
+KmsgRecord = namedtuple('KmsgRecord', ['facility', 'level', 'seq', 'timestamp', 'flags', 'message'])
+
+
+class KmsgReader:
+    """
+    Streaming-Leser für /dev/kmsg
+    Liest Datensatz für Datensatz ab Pufferanfang, filtert nach Facility und Regex
+    """
+
+    DEFAULT_PATTERN = re.compile(r'itco|watchdog|wdt|i2c|designware', re.IGNORECASE)
+
+    def __init__(self, path="/dev/kmsg", pattern=DEFAULT_PATTERN, facility=0):
+        self.path = path
+        self.pattern = re.compile(pattern, re.IGNORECASE) if isinstance(pattern, str) else pattern
+        self.facility = facility      # 0 = Kernel, None = alle
+        self.fd = None
+        self.lost = 0                 # Durch Ringpuffer-Überlauf verpasste Datensätze
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        os.lseek(self.fd, 0, os.SEEK_SET)  # Ab ältestem Eintrag im Ringpuffer
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    @staticmethod
+    def parse(raw):
+        """'prefix,seq,ts_usec,flags;text' (+ Fortsetzungszeilen) zerlegen"""
+        header, _, body = raw.decode('utf-8', errors='replace').partition(';')
+        fields = header.split(',')
+        prefix = int(fields[0])
+        return KmsgRecord(
+            facility=prefix >> 3,
+            level=prefix & 7,
+            seq=int(fields[1]),
+            timestamp=int(fields[2]) / 1e6,
+            flags=fields[3] if len(fields) > 3 else '',
+            message=body.split('\n', 1)[0],
+        )
+
+    def records(self, follow=False, poll_interval=1.0, running=lambda: True):
+        """Passende Datensätze liefern; mit follow auf neue Meldungen warten"""
+        if self.fd is None:
+            self.open()
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+
+        while running():
+            try:
+                raw = os.read(self.fd, 8192)  # Ein read() = genau ein Datensatz
+            except BlockingIOError:
+                if not follow:
+                    return
+                poller.poll(poll_interval * 1000)
+                continue
+            except OSError as e:
+                if e.errno == errno.EPIPE:    # Überschrieben - weiter beim nächsten
+                    self.lost += 1
+                    continue
+                raise
+
+            try:
+                record = self.parse(raw)
+            except (ValueError, IndexError):
+                continue
+            if self.facility is not None and record.facility != self.facility:
+                continue
+            if self.pattern and not self.pattern.search(record.message):
+                continue
+            yield record
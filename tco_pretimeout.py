@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pretimeout für den TCO Watchdog: letzter Zustand vor dem Hardware-Reset
+Kann der Treiber einen Pretimeout (z.B. softdog), meldet der Kernel ihn über
+den Governor 'noop' in /dev/kmsg ("watchdog0: pretimeout event"). Sonst prüft
+der Daemon selbst, ob der letzte Feed zu lange zurückliegt. In beiden Fällen
+wird der Zustand mit einem pwrite + fdatasync in eine vorab angelegte Datei
+geschrieben - ohne Anlegen, Umbenennen oder Metadaten-Änderung im Notfall.
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import struct
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DUMP_FILE = "/var/lib/tco-watchdog/pretimeout.json"
+DUMP_SIZE = 64 * 1024
+SYSFS_WATCHDOG = "/sys/class/watchdog"
+
+# ioctl Konstanten aus linux/watchdog.h
+WDIOC_GETSUPPORT = 0x80285700         # struct watchdog_info (40 Bytes)
+WDIOC_SETPRETIMEOUT = 0xC0045708
+WDIOC_GETPRETIMEOUT = 0x80045709
+WDIOF_PRETIMEOUT = 0x0200
+
+
+def sysfs_path(device):
+    """sysfs-Verzeichnis zum Watchdog-Device (/dev/watchdog = watchdog0)"""
+    try:
+        rdev = os.stat(device).st_rdev
+        wanted = f"{os.major(rdev)}:{os.minor(rdev)}"
+        for name in os.listdir(SYSFS_WATCHDOG):
+            with open(os.path.join(SYSFS_WATCHDOG, name, "dev")) as f:
+                if f.read().strip() == wanted:
+                    return os.path.join(SYSFS_WATCHDOG, name)
+    except OSError:
+        pass
+    return os.path.join(SYSFS_WATCHDOG, "watchdog0")
+
+
+def supports_pretimeout(fd):
+    """Meldet der Treiber WDIOF_PRETIMEOUT?"""
+    info = bytearray(40)
+    fcntl.ioctl(fd, WDIOC_GETSUPPORT, info)
+    return bool(struct.unpack_from('<I', info)[0] & WDIOF_PRETIMEOUT)
+
+
+def set_governor(sysfs, name="noop"):
+    """Pretimeout-Governor setzen und zurücklesen - True nur, wenn er wirklich aktiv ist"""
+    path = os.path.join(sysfs, "pretimeout_governor")
+    try:
+        with open(path, "r+") as f:   # Nicht anlegen - fehlt die Datei, gibt es keinen Governor
+            f.write(name)
+        with open(path) as f:
+            return f.read().strip() == name
+    except OSError as e:
+        logger.warning("Pretimeout-Governor '%s' nicht setzbar: %s", name, e)
+        return False
+
+
+def set_pretimeout(fd, seconds, sysfs):
+    """
+    Hardware-Pretimeout setzen - False, wenn der Treiber keinen hat (iTCO_wdt)
+    Nur zusammen mit dem Governor 'noop': 'panic' (oder ein Kernel ohne Governor)
+    würde den Kernel anhalten, bevor gesichert ist - dann Pretimeout wieder aus
+    """
+    if not supports_pretimeout(fd):
+        return False
+    if not set_governor(sysfs, "noop"):
+        fcntl.ioctl(fd, WDIOC_SETPRETIMEOUT, struct.pack('I', 0))
+        return False
+    fcntl.ioctl(fd, WDIOC_SETPRETIMEOUT, struct.pack('I', seconds))
+    return True
+
+
+def get_pretimeout(fd):
+    value = bytearray(4)
+    fcntl.ioctl(fd, WDIOC_GETPRETIMEOUT, value)
+    return struct.unpack('I', value)[0]
+
+
+def is_pretimeout_event(message, name="watchdog0"):
+    """Kernel-Meldung des noop-Governors für den eigenen Watchdog (z.B. 'watchdog0') erkennen"""
+    return re.search(rf'(^|\W){re.escape(name)}: pretimeout event', message, re.IGNORECASE) is not None
+
+
+class EmergencyDump:
+    """
+    Notfall-Abbild mit begrenzter Laufzeit
+    Datei und Puffer haben feste Größe und werden beim Start angelegt;
+    write() macht nur noch ein pwrite und ein fdatasync
+    """
+
+    def __init__(self, path=DUMP_FILE, size=DUMP_SIZE):
+        self.path = path
+        self.size = size
+        self.buffer = bytearray(size)
+        self.blank = memoryview(b' ' * size)
+        self.fd = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def read(path):
+        """Abbild lesen - None, wenn leer oder nicht vorhanden"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read().strip(b' \0\n')
+            return json.loads(data) if data else None
+        except (OSError, ValueError):
+            return None
+
+    def open(self):
+        """
+        Abbild vom letzten Lauf nach <Datei>.prev verschieben und zurückgeben,
+        dann die Datei leer in voller Größe neu anlegen
+        """
+        previous = self.read(self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if previous is not None:
+            os.replace(self.path, f"{self.path}.prev")
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        # Blöcke jetzt belegen - im Notfall wird nur noch überschrieben
+        os.pwrite(self.fd, self.blank, 0)
+        os.fsync(self.fd)
+        return previous
+
+    def write(self, state):
+        """Zustand sichern - liefert die Dauer in Sekunden oder None"""
+        if self.fd is None or not self.lock.acquire(blocking=False):
+            return None                   # Nicht geöffnet oder läuft schon
+        try:
+            start = time.monotonic()
+            data = json.dumps(state, separators=(',', ':'), default=str).encode()[:self.size - 1]
+            length = len(data)
+            self.buffer[:length] = data
+            self.buffer[length:] = self.blank[length:]
+            self.buffer[-1:] = b'\n'
+            os.pwrite(self.fd, self.buffer, 0)
+            os.fdatasync(self.fd)
+            return time.monotonic() - start
+        finally:
+            self.lock.release()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Echtzeit-Härtung für den Feed-Kontext des TCO Watchdogs
+SCHED_FIFO + CPU-Pinning für den aufrufenden Thread, mlockall + Prefault
+für den ganzen Prozess, sowie ein Stress-Benchmark der Feed-Latenz.
+
+Aufruf:
+    python3 tco_realtime.py [SEKUNDEN] [PRIORITÄT] [CPU]
+"""
+
+import os
+import gc
+import sys
+import time
+import ctypes
+import ctypes.util
+import logging
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# mlockall Flags aus sys/mman.h
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Bleibt für die Lebensdauer des Prozesses gemappt und gesperrt
+_reserve = None
+
+
+def lock_memory(prefault_kb=1024):
+    """
+    Gesamten Prozess-Speicher sperren (auch künftige Mappings, z.B. Thread-Stacks)
+    und eine Heap-Reserve vorab einlagern, damit der Feed-Pfad nie auf Page-Faults wartet
+    """
+    global _reserve
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, f"mlockall fehlgeschlagen: {os.strerror(err)}")
+
+    # Jede Seite einmal beschreiben = sofort einlagern
+    _reserve = bytearray(prefault_kb * 1024)
+    for offset in range(0, len(_reserve), PAGE_SIZE):
+        _reserve[offset] = 1
+
+    # Bestehende Objekte aus der zyklischen GC nehmen (kürzere GC-Pausen)
+    gc.collect()
+    gc.freeze()
+
+
+def enter_realtime(priority=50, cpu=None):
+    """
+    Aufrufenden Thread auf SCHED_FIFO setzen und optional auf eine CPU pinnen
+    Achtung: danach gestartete Threads erben Policy und Affinität
+    """
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+
+    # GIL häufiger abgeben, damit der RT-Thread ihn schnell bekommt
+    sys.setswitchinterval(0.001)
+
+
+def _cpu_hog(stop):
+    while not stop.is_set():
+        for _ in range(100000):
+            pass
+
+
+def _memory_hog(stop, megabytes):
+    # Speicher fortlaufend neu anfordern und berühren (Page-Faults, Reclaim)
+    while not stop.is_set():
+        block = bytearray(megabytes * 1024 * 1024)
+        for offset in range(0, len(block), PAGE_SIZE):
+            block[offset] = 1
+        del block
+
+
+def _busy_thread(stop):
+    # Nicht-kritische Arbeit im selben Prozess (konkurriert um den GIL)
+    while not stop.is_set():
+        sum(range(10000))
+
+
+def _measure(realtime, priority, cpu, seconds, period, result):
+    """Wecklatenz eines periodischen Feed-Loops messen (in eigenem Prozess)"""
+    # Vor enter_realtime() starten - neue Threads erben sonst SCHED_FIFO
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_thread, args=(stop,), daemon=True)
+    worker.start()
+
+    mode = "normal"
+    if realtime:
+        try:
+            lock_memory()
+            enter_realtime(priority, cpu)
+            mode = f"SCHED_FIFO {priority}" + (f", CPU {cpu}" if cpu is not None else "") + ", mlockall"
+        except (OSError, PermissionError) as e:
+            mode = f"Echtzeit nicht verfügbar ({e})"
+
+    fd = os.open(os.devnull, os.O_WRONLY)
+    latencies = []
+    deadline = time.monotonic() + period
+    end = time.monotonic() + seconds
+    while deadline < end:
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        os.write(fd, b'1')  # Stellvertretend für den Watchdog-Feed
+        latencies.append(time.monotonic() - deadline)
+        deadline += period
+    os.close(fd)
+    stop.set()
+
+    latencies.sort()
+    result.put({
+        'mode': mode,
+        'samples': len(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'max_ms': latencies[-1] * 1000,
+    })
+
+
+def run_benchmark(seconds=20, priority=50, cpu=None, period=0.01, memory_mb=64):
+    """Worst-Case-Feed-Latenz unter CPU- und Speicherlast mit und ohne Echtzeit-Modus"""
+    ctx = multiprocessing.get_context('fork')
+    results = []
+
+    for realtime in (False, True):
+        stop = ctx.Event()
+        hogs = [ctx.Process(target=_cpu_hog, args=(stop,), daemon=True)
+                for _ in range(os.cpu_count() * 2)]
+        hogs.append(ctx.Process(target=_memory_hog, args=(stop, memory_mb), daemon=True))
+        for hog in hogs:
+            hog.start()
+
+        result = ctx.Queue()
+        probe = ctx.Process(target=_measure,
+                            args=(realtime, priority, cpu, seconds, period, result))
+        probe.start()
+        results.append(result.get())
+        probe.join()
+
+        stop.set()
+        for hog in hogs:
+            hog.join()
+
+    print(f"\n=== FEED-LATENZ UNTER LAST ({seconds}s je Lauf, Periode {period * 1000:g} ms) ===")
+    print(f"{'Modus':<45} {'Samples':>8} {'Mittel':>9} {'p99':>9} {'Max':>9}")
+    for r in results:
+        print(f"{r['mode']:<45} {r['samples']:>8} {r['mean_ms']:>7.2f}ms "
+              f"{r['p99_ms']:>7.2f}ms {r['max_ms']:>7.2f}ms")
+    return results
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    priority = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    cpu = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    run_benchmark(seconds, priority, cpu)
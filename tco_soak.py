@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Soak- und Pretimeout-Test für den TCO Watchdog
+Der Controller läuft mit simuliertem PCA9555 (SimulatedBus) und simuliertem
+Watchdog-Device in virtueller Zeit (tco_clock.VirtualClock); Zustand nur in
+einem temporären Verzeichnis. Aufruf über tco-watchdog.py:
+    python3 tco-watchdog.py soak [TAGE]
+    python3 tco-watchdog.py pretimeout-test [DEVICE]
+"""
+
+import os
+import errno
+import random
+import logging
+import tempfile
+import threading
+import configparser
+
+import tco_journal
+import tco_pretimeout
+from tco_clock import SystemClock, VirtualClock
+from tco_i2c import HEALTH_STUCK
+
+
+class SimulatedBus:
+    """
+    PCA9555-Nachbildung für den Soak-Test
+    Fehlerfenster (virtuelle Zeit) lassen jede Transaktion mit EIO scheitern
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.regs = {0x00: 0xFF, 0x01: 0xFF, 0x02: 0xFF, 0x03: 0xFF, 0x06: 0xFF, 0x07: 0xFF}
+        self.faults = []              # Liste von (Start, Ende)
+        self.hangs = []               # Transaktion blockiert bis Ende, dann ETIMEDOUT
+        self.transactions = 0
+        self.errors = 0
+
+    def _transaction(self):
+        self.transactions += 1
+        now = self.clock.monotonic()
+        for start, end in self.hangs:
+            if start <= now < end:
+                # Hängender Controller: blockiert den Worker bis zum Ende des Fensters
+                self.clock.sleep(end - now)
+                self.errors += 1
+                raise OSError(errno.ETIMEDOUT, "Connection timed out")
+        if any(start <= now < end for start, end in self.faults):
+            self.errors += 1
+            raise OSError(5, "Input/output error")
+
+    def read_byte_data(self, addr, reg):
+        self._transaction()
+        return self.regs[reg]
+
+    def write_byte_data(self, addr, reg, value):
+        self._transaction()
+        self.regs[reg] = value & 0xFF
+
+    def read_word_data(self, addr, reg):
+        self._transaction()
+        return self.regs[reg] | (self.regs[reg + 1] << 8)
+
+    def set_input(self, port, pin, level):
+        if level:
+            self.regs[port] |= (1 << pin)
+        else:
+            self.regs[port] &= ~(1 << pin)
+
+    def close(self):
+        pass
+
+
+class SoakTestWatchdog:
+    """
+    Controller mit simuliertem Watchdog-Device für den Soak-Test (Mixin, siehe soak_controller)
+    Zeichnet Feeds, Reset-Auslösungen und Pretimeout-Abbilder in virtueller Zeit auf
+    Mit device (z.B. softdog) wird stattdessen ein echtes Device gefüttert
+    """
+
+    def __init__(self, clock, bus, device=None):
+        self.feed_times = []
+        self.reset_times = []
+        self.health_log = []          # (Zeit, Zustand) aller I2C-Zustandswechsel
+        self.dump_times = []          # (Zeit, Quelle) aller Pretimeout-Abbilder
+        self.test_device = device
+        # Heartbeats und Abbild nur im Testverzeichnis, nichts unter /run oder /var
+        self.state_dir = tempfile.TemporaryDirectory(prefix="tco-soak-")
+        super().__init__(clock=clock, bus=bus,
+                         heartbeat_dir=os.path.join(self.state_dir.name, "heartbeat"),
+                         dump_file=os.path.join(self.state_dir.name, "pretimeout.json"))
+
+    def read_config(self):
+        return configparser.ConfigParser()  # Keine Konfiguration aus /etc
+
+    def close(self):
+        """I2C-Worker beenden und Testverzeichnis entfernen"""
+        self.i2c.close()
+        self.dump.close()
+        self.heartbeats.close()
+        self.state_dir.cleanup()
+
+    def setup_tco_watchdog(self):
+        if self.test_device is None:
+            self.watchdog_fd = os.open(os.devnull, os.O_WRONLY)
+        else:
+            # Echtes Device, aber ohne iTCO-Modulprüfung
+            self.watchdog_device = self.test_device
+            self.watchdog_fd = os.open(self.test_device, os.O_WRONLY)
+            self.set_timeout(self.timeout)
+            self.setup_pretimeout()
+        self.feed_watchdog()
+
+    def feed_watchdog(self):
+        result = super().feed_watchdog()
+        if result:
+            self.feed_times.append(self.clock.monotonic())
+        return result
+
+    def check_i2c_health(self):
+        previous = self.i2c_health
+        health = super().check_i2c_health()
+        if health != previous:
+            self.health_log.append((self.clock.monotonic(), health))
+        return health
+
+    def emergency_flush(self, source):
+        written = super().emergency_flush(source)
+        if written:
+            self.dump_times.append((self.clock.monotonic(), source))
+        return written
+
+    def trigger_immediate_reset(self):
+        # Kein echter Reset - nur protokollieren und Simulation beenden
+        self.reset_times.append(self.clock.monotonic())
+        self.running = False
+
+
+def soak_controller(base):
+    """Testklasse zum Controller base (IntelTCOWatchdog aus tco-watchdog.py) bilden"""
+    return type('SoakTestWatchdog', (SoakTestWatchdog, base), {})
+
+
+def run_soak(base, days=7.0, seed=1):
+    """
+    Simulierte Laufzeit mit Feeds, Schalterbetätigungen, Bus-Fehlern und hängendem Bus
+    Prüft: Feed-Reserve nie unter timeout/2, Reset erst nach voller Haltezeit,
+    hängender Bus wird als eigener Zustand erkannt
+    """
+    clock = VirtualClock()
+    bus = SimulatedBus(clock)
+    clock.register()                  # Auch der Konstruktor wartet schon auf den I2C-Worker
+    controller = soak_controller(base)(clock, bus)
+    logger = logging.getLogger(base.__module__)
+    rng = random.Random(seed)
+    duration = days * 86400
+    min_margin = controller.timeout / 2
+    hold = controller.reset_hold_time
+
+    # Ereignisplan: (Zeit, Aktion, Parameter)
+    events = []
+    t = 60.0
+    while t < duration:
+        events.append((t, 'press', rng.uniform(0.2, hold - 0.5)))     # Zu kurz - kein Reset
+        if rng.random() < 0.25:
+            events.append((t + rng.uniform(60, 1800), 'fault', rng.uniform(1, 120)))
+        t += rng.uniform(600, 7200)
+    for day in range(int(days) or 1):
+        start = day * 86400 + rng.uniform(600, min(duration, 86400) - 3600)
+        events.append((start, 'hang', rng.uniform(30, 300)))
+    events.append((duration, 'press', hold + 1.0))                     # Langer Druck - Reset
+    events.sort()
+
+    # Rate-Limiting wie im Betrieb, aber in virtueller Zeit
+    limiter = tco_journal.RateLimitFilter(rate=0.1, burst=5, clock=clock.monotonic)
+    logger.addFilter(limiter)
+
+    pressed = []                      # (Start, Ende) aller Betätigungen
+    threads = controller.start_threads()
+
+    for when, action, param in events:
+        if not controller.running:
+            break
+        clock.sleep(when - clock.monotonic())
+        if action == 'fault':
+            bus.faults.append((when, when + param))
+        elif action == 'hang':
+            bus.hangs.append((when, when + param))
+        else:
+            pressed.append((when, when + param))
+            bus.set_input(controller.SWITCH_PORT, controller.SWITCH_PIN, False)   # NC: gedrückt = LOW
+            clock.sleep(param)
+            bus.set_input(controller.SWITCH_PORT, controller.SWITCH_PIN, True)
+
+    clock.sleep(controller.heartbeat_interval)
+    controller.running = False
+    clock.unregister()
+    for thread in threads:
+        thread.join()
+    controller.close()
+    logger.removeFilter(limiter)
+
+    # Invarianten prüfen
+    violations = []
+    feeds = controller.feed_times
+    gaps = [b - a for a, b in zip(feeds, feeds[1:])]
+    worst_margin = controller.timeout - max(gaps) if gaps else 0
+    if worst_margin < min_margin:
+        violations.append(f"Feed-Reserve {worst_margin:.1f}s < {min_margin:.1f}s")
+
+    for reset in controller.reset_times:
+        press = next(((s, e) for s, e in pressed if s <= reset <= e), None)
+        if press is None:
+            violations.append(f"Reset bei t={reset:.1f}s ohne gedrückten Schalter")
+        elif reset - press[0] < hold:
+            violations.append(f"Reset nach {reset - press[0]:.2f}s statt {hold}s Haltezeit")
+    if len(controller.reset_times) != 1:
+        violations.append(f"{len(controller.reset_times)} Resets statt genau einem")
+    for when, source in controller.dump_times:
+        violations.append(f"Pretimeout ({source}) bei t={when:.1f}s trotz regelmäßiger Feeds")
+
+    for start, end in bus.hangs:
+        if not any(start <= t <= end and h == HEALTH_STUCK for t, h in controller.health_log):
+            violations.append(f"Hängender Bus bei t={start:.0f}s nicht als '{HEALTH_STUCK}' erkannt")
+
+    print(f"\n=== SOAK-TEST ({days:g} Tage virtuell) ===")
+    print(f"Feeds: {len(feeds)}, schlechteste Feed-Reserve: {worst_margin:.1f}s")
+    print(f"Schalterbetätigungen: {len(pressed)}, Resets: {len(controller.reset_times)}")
+    print(f"Bus-Transaktionen: {bus.transactions}, davon fehlerhaft: {bus.errors}")
+    print(f"Bus-Hänger: {len(bus.hangs)}, I2C-Zustandswechsel: {len(controller.health_log)}, "
+          f"verworfene I2C-Befehle: {controller.i2c.dropped}")
+    for violation in violations:
+        print(f"✗ {violation}")
+    if not violations:
+        print("✓ Alle Invarianten erfüllt")
+    return not violations
+
+
+def run_pretimeout_test(base, device=None):
+    """
+    Pretimeout-Pfad prüfen: Füttern sperren und warten, bis das Abbild geschrieben ist
+    Ohne device in virtueller Zeit, mit device (z.B. softdog mit soft_noboot=1) in Echtzeit;
+    der Watchdog wird vor Ablauf per Magic Close gestoppt
+    """
+    TEST_GATE = 1 << 16               # Außerhalb der 16 Eingänge
+    virtual = device is None
+    clock = VirtualClock() if virtual else SystemClock()
+    if virtual:
+        clock.register()
+    controller = soak_controller(base)(clock, SimulatedBus(clock), device=device)
+
+    threads = controller.start_threads()
+    if controller.hw_pretimeout:
+        threading.Thread(target=controller.kernel_log_thread, name="kernel-log", daemon=True).start()
+
+    # Ein paar normale Feeds, dann Füttern sperren wie bei einer hängenden Anwendung
+    clock.sleep(controller.heartbeat_interval * 2 + 1)
+    controller.feed_gate_active |= TEST_GATE
+    blocked_feed = controller.last_feed_monotonic
+    while not controller.dump_times and clock.monotonic() < blocked_feed + controller.timeout - 1:
+        clock.sleep(0.5)
+
+    controller.stop_watchdog_safely()
+    controller.running = False
+    if virtual:
+        clock.unregister()
+    for thread in threads:
+        thread.join()
+    controller.dump.close()
+
+    # Ergebnis prüfen
+    violations = []
+    dump = tco_pretimeout.EmergencyDump.read(controller.dump.path)
+    controller.close()
+    earliest = controller.timeout - controller.pretimeout
+    if not controller.dump_times or dump is None:
+        violations.append("Kein Pretimeout-Abbild vor Ablauf des Timeouts")
+    else:
+        if not earliest - 1 <= dump['since_feed_s'] < controller.timeout:
+            violations.append(f"Abbild nach {dump['since_feed_s']:.1f}s statt "
+                              f"{earliest}..{controller.timeout}s ohne Feed")
+        if not dump['feed_history']:
+            violations.append("Feed-Historie im Abbild leer")
+        if not (dump['feed_block_reason'] or '').startswith('gate'):
+            violations.append(f"Grund im Abbild: {dump['feed_block_reason']!r} statt Gate-Sperre")
+        if 'i2c' not in dump or 'errors' not in dump['i2c']:
+            violations.append("I2C-Fehlerstand fehlt im Abbild")
+
+    print(f"\n=== PRETIMEOUT-TEST ({device or 'simuliertes Device'}) ===")
+    print(f"Pretimeout: {controller.pretimeout}s vor {controller.timeout}s Timeout, "
+          f"{'Hardware + Software' if controller.hw_pretimeout else 'Software'}")
+    if dump is not None:
+        print(f"Abbild ({dump['source']}) nach {dump['since_feed_s']:.1f}s ohne Feed: "
+              f"{len(dump['feed_history'])} Feeds, Grund: {dump['feed_block_reason']}, "
+              f"I2C {dump['i2c']['health']}")
+    for violation in violations:
+        print(f"✗ {violation}")
+    if not violations:
+        print("✓ Zustand vor dem Reset gesichert")
+    return not violations